@@ -0,0 +1,101 @@
+import datetime as dt
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import (
+    Comment, DailyAuthor, DailyGroupStats, DailyStats, Post, Watermark
+)
+
+
+def add_counts(model, keys, totals, **lookup):
+    """Прибавляет totals[key] = {поле: n} к строкам model, создавая недостающие."""
+    for key, values in totals.items():
+        filters = dict(zip(keys, key if isinstance(key, tuple) else (key,)))
+        updated = model.objects.filter(**filters).update(
+            **{field: F(field) + n for field, n in values.items()}
+        )
+        if not updated:
+            model.objects.create(**filters, **values)
+
+
+def rollup(batch_size=None):
+    """Сворачивает новые посты и комментарии в дневные сводки.
+
+    Строки читаются после водяных отметок и учитываются ровно один раз:
+    сводки и отметки обновляются в одной транзакции. Удаления в сводки не
+    попадают — это счетчики событий. Возвращает число учтенных строк.
+    """
+    batch_size = batch_size or settings.ROLLUP_BATCH_SIZE
+    days = {}
+    groups = {}
+    authors = set()
+
+    def bump(totals, key, field):
+        totals.setdefault(key, Counter())[field] += 1
+
+    with transaction.atomic():
+        posts = Watermark.get('rollup:posts').read_after(
+            Post.objects.all(), ['pub_date', 'group_id', 'author_id'], batch_size,
+        )
+        for _, pub_date, group_id, author_id in posts:
+            day = pub_date.date()
+            bump(days, day, 'posts')
+            if group_id is not None:
+                bump(groups, (day, group_id), 'posts')
+            authors.add((day, author_id))
+
+        comments = Watermark.get('rollup:comments').read_after(
+            Comment.objects.all(), ['created', 'post__group', 'author_id'], batch_size,
+        )
+        for _, created, group_id, author_id in comments:
+            day = created.date()
+            bump(days, day, 'comments')
+            if group_id is not None:
+                bump(groups, (day, group_id), 'comments')
+            authors.add((day, author_id))
+
+        if authors:
+            known = set(
+                DailyAuthor.objects.filter(
+                    day__in={day for day, _ in authors},
+                    author_id__in={author_id for _, author_id in authors},
+                ).values_list('day', 'author_id')
+            )
+            fresh = authors - known
+            DailyAuthor.objects.bulk_create(
+                DailyAuthor(day=day, author_id=author_id)
+                for day, author_id in fresh
+            )
+            for day, _ in fresh:
+                bump(days, day, 'active_authors')
+
+        add_counts(DailyStats, ['day'], days)
+        add_counts(DailyGroupStats, ['day', 'group_id'], groups)
+    return len(posts) + len(comments)
+
+
+def dashboard(days=None):
+    """Данные для страницы аналитики: только из дневных сводок."""
+    days = days or settings.ANALYTICS_DAYS
+    since = dt.date.today() - dt.timedelta(days=days - 1)
+    daily = list(DailyStats.objects.filter(day__gte=since).order_by('day'))
+    peak = max([1] + [max(row.posts, row.comments) for row in daily])
+    top_groups = list(
+        DailyGroupStats.objects.filter(day__gte=since).order_by()
+        .values('group__title', 'group__slug')
+        .annotate(posts=Sum('posts'), comments=Sum('comments'))
+        .order_by('-posts')[:settings.ANALYTICS_TOP_GROUPS]
+    )
+    return {
+        'daily': daily,
+        'peak': peak,
+        'top_groups': top_groups,
+        'totals': {
+            'posts': sum(row.posts for row in daily),
+            'comments': sum(row.comments for row in daily),
+        },
+        'since': since,
+    }
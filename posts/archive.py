@@ -0,0 +1,100 @@
+import datetime as dt
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import (
+    ArchivedComment, ArchivedPost, Comment, LikeCounter, Post
+)
+from .paginator import adjust_count, cached_count
+
+
+def archive_scope(author_id):
+    return f'archive:author:{author_id}'
+
+
+def archived_count(author_id):
+    return cached_count(
+        archive_scope(author_id),
+        ArchivedPost.objects.filter(author_id=author_id),
+    )
+
+
+def archive_batch(cutoff, batch_size=None):
+    """Переносит пачку постов старше cutoff вместе с комментариями в архив.
+
+    Пачка переносится в одной короткой транзакции, так что горячая таблица
+    остается доступной между пачками. Лайки сворачиваются в likes_total,
+    теги, упоминания и рейтинги архивных постов удаляются вместе с
+    постом. Возвращает число перенесенных постов.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    with transaction.atomic():
+        posts = list(
+            Post.objects.filter(pub_date__lt=cutoff).order_by('pub_date')
+            [:batch_size]
+        )
+        if not posts:
+            return 0
+        ids = [post.id for post in posts]
+        likes = dict(
+            LikeCounter.objects.filter(post_id__in=ids)
+            .values_list('post_id').annotate(total=Sum('count'))
+        )
+        ArchivedPost.objects.bulk_create(
+            ArchivedPost(
+                id=post.id,
+                text=post.text,
+                pub_date=post.pub_date,
+                author_id=post.author_id,
+                group_id=post.group_id,
+                image=post.image.name or None,
+                views=post.views,
+                likes_total=max(likes.get(post.id, 0), 0),
+            )
+            for post in posts
+        )
+        ArchivedComment.objects.bulk_create(
+            ArchivedComment(
+                id=comment.id,
+                post_id=comment.post_id,
+                author_id=comment.author_id,
+                text=comment.text,
+                created=comment.created,
+            )
+            for comment in Comment.objects.filter(post_id__in=ids)
+        )
+        Post.objects.filter(id__in=ids).delete()
+    authors = {}
+    for post in posts:
+        authors[post.author_id] = authors.get(post.author_id, 0) + 1
+    for author_id, count in authors.items():
+        adjust_count([archive_scope(author_id)], count)
+    return len(posts)
+
+
+def archive(max_age=None, batch_size=None, pause=0.0, progress=None):
+    max_age = max_age or settings.ARCHIVE_AFTER_DAYS
+    cutoff = dt.datetime.now() - dt.timedelta(days=max_age)
+    total = 0
+    while True:
+        done = archive_batch(cutoff, batch_size)
+        if not done:
+            return total
+        total += done
+        if progress is not None:
+            progress(total)
+        if pause:
+            time.sleep(pause)
+
+
+def find_archived(post_id, author):
+    post = (
+        ArchivedPost.objects.select_related('group')
+        .filter(pk=post_id, author=author).first()
+    )
+    if post is not None:
+        ArchivedPost.author.field.set_cached_value(post, author)
+    return post
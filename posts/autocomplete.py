@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Group, User
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """Отсортированный список ключей для поиска по префиксу.
+
+    Ключи (строки в нижнем регистре) и id записей лежат в двух
+    параллельных списках, упорядоченных по ключу: поиск — один bisect и
+    проход по совпадениям, вставка и удаление — bisect и сдвиг списка.
+    """
+
+    def __init__(self, items=()):
+        entries = sorted((text.lower(), pk) for pk, text, _ in items)
+        self.keys = [key for key, _ in entries]
+        self.ids = [pk for _, pk in entries]
+        self.values = {pk: (text.lower(), value) for pk, text, value in items}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _position(self, key, pk):
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.ids[i] == pk:
+                return i
+            i += 1
+        return None
+
+    def add(self, pk, text, value):
+        key = text.lower()
+        if self.values.get(pk, (None,))[0] == key:
+            self.values[pk] = (key, value)
+            return
+        self.discard(pk)
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, pk)
+        self.values[pk] = (key, value)
+
+    def discard(self, pk):
+        entry = self.values.pop(pk, None)
+        if entry is None:
+            return
+        i = self._position(entry[0], pk)
+        if i is not None:
+            del self.keys[i]
+            del self.ids[i]
+
+    def search(self, prefix, limit):
+        prefix = prefix.lower()
+        results = []
+        i = bisect_left(self.keys, prefix)
+        while (
+            i < len(self.keys)
+            and len(results) < limit
+            and self.keys[i].startswith(prefix)
+        ):
+            results.append(self.values[self.ids[i]][1])
+            i += 1
+        return results
+
+
+def user_rows(queryset):
+    for pk, username in queryset.values_list('id', 'username').iterator():
+        yield pk, username, username
+
+
+def group_rows(queryset):
+    for pk, title, slug in queryset.values_list('id', 'title', 'slug'):
+        yield pk, title, {'title': title, 'slug': slug}
+
+
+class Source:
+    """Индекс одного вида записей в памяти процесса.
+
+    Полностью перечитывается раз в AUTOCOMPLETE_TTL секунд в фоновом
+    потоке; пока идёт перестройка, поиск отвечает по старому индексу.
+    Между перестройками новые записи других процессов подтягиваются по id
+    не реже раза в AUTOCOMPLETE_REFRESH секунд, изменения этого процесса
+    приходят от сигналов сразу.
+    """
+
+    def __init__(self, queryset, rows):
+        self.queryset = queryset
+        self.rows = rows
+        self.lock = threading.Lock()
+        self.index = None
+        self.last_id = 0
+        self.expires = 0.0
+        self.checked = 0.0
+        # Изменения от сигналов во время фоновой перестройки: их нужно
+        # повторить на новом индексе, иначе подмена их потеряет.
+        self.changes = None
+
+    def load(self):
+        items = list(self.rows(self.queryset()))
+        return PrefixIndex(items), max((pk for pk, _, _ in items), default=0)
+
+    def install(self, index, last_id):
+        now = time.monotonic()
+        for pk, row in self.changes or ():
+            if row is None:
+                index.discard(pk)
+            else:
+                index.add(*row)
+                last_id = max(last_id, pk)
+        self.index = index
+        self.last_id = last_id
+        self.changes = None
+        self.expires = now + settings.AUTOCOMPLETE_TTL
+        self.checked = now + settings.AUTOCOMPLETE_REFRESH
+
+    def rebuild(self):
+        try:
+            index, last_id = self.load()
+        except Exception:
+            logger.exception('Индекс автодополнения не перестроен')
+            with self.lock:
+                self.changes = None
+                self.expires = time.monotonic() + settings.AUTOCOMPLETE_REFRESH
+            return
+        with self.lock:
+            self.install(index, last_id)
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            connection.close()
+
+    def start_rebuild(self):
+        threading.Thread(target=self.rebuild_in_background, daemon=True).start()
+
+    def get(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.index is None:
+                self.changes = None
+                self.install(*self.load())
+                return self.index
+            if self.expires <= now and self.changes is None:
+                self.changes = []
+                rebuild = True
+            else:
+                rebuild = False
+            if self.checked <= now:
+                for pk, text, value in self.rows(
+                    self.queryset().filter(id__gt=self.last_id)
+                ):
+                    self.add(pk, (pk, text, value))
+                self.checked = now + settings.AUTOCOMPLETE_REFRESH
+            index = self.index
+        if rebuild:
+            self.start_rebuild()
+        return index
+
+    def add(self, pk, row):
+        self.index.add(*row)
+        self.last_id = max(self.last_id, pk)
+        if self.changes is not None:
+            self.changes.append((pk, row))
+
+    def update(self, pk, row=None):
+        """Меняет запись в уже загруженном индексе; row=None — удалить."""
+        with self.lock:
+            if self.index is None:
+                return
+            if row is None:
+                self.index.discard(pk)
+                if self.changes is not None:
+                    self.changes.append((pk, None))
+            else:
+                self.add(pk, row)
+
+    def search(self, prefix, limit=None):
+        index = self.get()
+        with self.lock:
+            return index.search(prefix, limit or settings.AUTOCOMPLETE_LIMIT)
+
+
+sources = {
+    'users': Source(lambda: User.objects.filter(is_active=True), user_rows),
+    'groups': Source(lambda: Group.objects.all(), group_rows),
+}
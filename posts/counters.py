@@ -0,0 +1,88 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Копит просмотры постов в памяти процесса и сбрасывает их в БД пачкой.
+
+    Сброс происходит, когда накопилось VIEW_COUNTER_MAX_PENDING просмотров
+    или прошло VIEW_COUNTER_INTERVAL секунд; при падении процесса теряется
+    не больше этого.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.hits = 0
+        self.flushed_at = time.monotonic()
+        self.local = threading.local()
+
+    @contextmanager
+    def paused(self):
+        """Просмотры внутри блока (в этом потоке) не считаются."""
+        self.local.paused = True
+        try:
+            yield
+        finally:
+            self.local.paused = False
+
+    def hit(self, post_id):
+        if getattr(self.local, 'paused', False):
+            return
+        with self.lock:
+            self.pending[post_id] += 1
+            self.hits += 1
+            due = (
+                self.hits >= settings.VIEW_COUNTER_MAX_PENDING
+                or time.monotonic() - self.flushed_at >= settings.VIEW_COUNTER_INTERVAL
+            )
+        if due:
+            try:
+                self.flush()
+            except Exception as error:
+                # Просмотры остались в pending и уйдут со следующим сбросом;
+                # страница поста из-за этого падать не должна.
+                logger.warning('Просмотры не сохранены: %r', error)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.hits = 0
+            self.flushed_at = time.monotonic()
+        items = sorted(pending.items())
+        size = settings.VIEW_COUNTER_BATCH_SIZE
+        for start in range(0, len(items), size):
+            batch = items[start:start + size]
+            try:
+                Post.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                    views=F('views') + Case(
+                        *[When(pk=pk, then=Value(count)) for pk, count in batch],
+                        output_field=IntegerField(),
+                    )
+                )
+            except Exception:
+                with self.lock:
+                    self.pending.update(dict(items[start:]))
+                raise
+        return len(items)
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as error:
+            logger.warning('Просмотры не сохранены при выходе: %r', error)
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush_at_exit)
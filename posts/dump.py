@@ -0,0 +1,89 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Max
+
+from . import groupstats, tags
+from .models import (
+    ArchivedComment, ArchivedPost, Comment, Follow, Group, Post, User,
+    Watermark
+)
+
+MODELS = [User, Group, Post, Comment, Follow, ArchivedPost, ArchivedComment]
+
+
+def iter_rows(queryset, chunk_size):
+    """Обходит queryset порциями по первичному ключу, не держа его в памяти."""
+    fields = [field.attname for field in queryset.model._meta.concrete_fields]
+    last = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        rows = list(chunk.values(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][queryset.model._meta.pk.attname]
+
+
+def export_lines(querysets, chunk_size):
+    for queryset in querysets:
+        label = queryset.model._meta.label_lower
+        for row in iter_rows(queryset, chunk_size):
+            yield json.dumps(
+                {'model': label, 'fields': row},
+                cls=DjangoJSONEncoder,
+                ensure_ascii=False,
+            ) + '\n'
+
+
+def build(model, fields):
+    columns = {field.attname: field for field in model._meta.concrete_fields}
+    return model(**{
+        attname: None if value is None else columns[attname].to_python(value)
+        for attname, value in fields.items()
+    })
+
+
+def import_lines(lines, batch_size):
+    """Создает объекты через bulk_create, поэтому сигналы save не шлются.
+
+    Производные данные пересобираются один раз в конце (rebuild_derived).
+    """
+    models = {model._meta.label_lower: model for model in MODELS}
+    imported = {}
+    batch, model = [], None
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        current = models[record['model']]
+        if current is not model or len(batch) >= batch_size:
+            flush(model, batch, imported)
+            batch, model = [], current
+        batch.append(build(model, record['fields']))
+    flush(model, batch, imported)
+    rebuild_derived(list(imported))
+    return imported
+
+
+def flush(model, batch, imported):
+    if batch:
+        model.objects.bulk_create(batch)
+        imported[model] = imported.get(model, 0) + len(batch)
+
+
+def rebuild_derived(models):
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    mark = Watermark.get('notifications')
+    mark.position = Post.objects.aggregate(last=Max('id'))['last'] or 0
+    mark.save()
+    groupstats.rebuild()
+    tags.backfill(1000)
+    cache.clear()
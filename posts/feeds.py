@@ -0,0 +1,76 @@
+from django.contrib.syndication.views import Feed
+from django.db.models import Max
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from .models import Group, Post, User
+
+FEED_SIZE = 20
+
+
+class PostFeed(Feed):
+    feed_type = Atom1Feed
+
+    def items(self, obj):
+        return obj.posts.select_related('author')[:FEED_SIZE]
+
+    def item_title(self, item):
+        return item.text[:80]
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('post', args=[item.author.username, item.id])
+
+    def item_author_name(self, item):
+        return item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+
+class AuthorFeed(PostFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Записи {obj.username}'
+
+    def link(self, obj):
+        return reverse('profile', args=[obj.username])
+
+    def subtitle(self, obj):
+        return f'Новые записи пользователя {obj.username} на Yatube'
+
+
+class GroupFeed(PostFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return obj.title
+
+    def link(self, obj):
+        return reverse('group', args=[obj.slug])
+
+    def subtitle(self, obj):
+        return obj.description
+
+
+def author_updated(request, username):
+    return Post.objects.filter(author__username=username).aggregate(
+        last=Max('pub_date')
+    )['last']
+
+
+def group_updated(request, slug):
+    return Post.objects.filter(group__slug=slug).aggregate(
+        last=Max('pub_date')
+    )['last']
+
+
+author_feed = condition(last_modified_func=author_updated)(AuthorFeed())
+group_feed = condition(last_modified_func=group_updated)(GroupFeed())
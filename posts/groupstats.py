@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+
+from .models import Group, GroupStats, Post
+
+
+def recent_authors(group_id):
+    names = []
+    rows = (
+        Post.objects.filter(group_id=group_id)
+        .values_list('author__username', flat=True)
+        [:settings.GROUP_RECENT_AUTHORS * 10]
+    )
+    for name in rows:
+        if name not in names:
+            names.append(name)
+            if len(names) == settings.GROUP_RECENT_AUTHORS:
+                break
+    return names
+
+
+def refresh(group_id):
+    """Пересчитывает сводку одного сообщества целиком."""
+    stats = Post.objects.filter(group_id=group_id).aggregate(
+        count=Count('id'), last=Max('pub_date')
+    )
+    GroupStats.objects.update_or_create(group_id=group_id, defaults={
+        'posts_count': stats['count'],
+        'last_post_at': stats['last'],
+        'recent_authors': ' '.join(recent_authors(group_id)),
+    })
+
+
+def refresh_recent(group_id):
+    GroupStats.objects.filter(group_id=group_id).update(
+        last_post_at=Post.objects.filter(group_id=group_id)
+        .aggregate(last=Max('pub_date'))['last'],
+        recent_authors=' '.join(recent_authors(group_id)),
+    )
+
+
+def post_added(group_id, post):
+    stats = GroupStats.objects.filter(group_id=group_id).first()
+    if stats is None:
+        refresh(group_id)
+        return
+    GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=F('posts_count') + 1
+    )
+    if stats.last_post_at is not None and post.pub_date < stats.last_post_at:
+        # Пост из прошлого (смена сообщества): последние авторы те же,
+        # если он не среди них.
+        if post.author.username not in stats.authors():
+            refresh_recent(group_id)
+        return
+    names = [post.author.username]
+    names += [name for name in stats.authors() if name != names[0]]
+    GroupStats.objects.filter(group_id=group_id).update(
+        last_post_at=post.pub_date,
+        recent_authors=' '.join(names[:settings.GROUP_RECENT_AUTHORS]),
+    )
+
+
+def post_removed(group_id, post):
+    updated = GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=F('posts_count') - 1
+    )
+    if not updated:
+        refresh(group_id)
+        return
+    # Удаленный пост мог быть последним или его автор — среди недавних.
+    # Пересчет идет по индексу (group, -pub_date) и читает лишь
+    # несколько последних строк.
+    refresh_recent(group_id)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересобирает все сводки: после импорта или для сверки."""
+    totals = {
+        row['group']: row
+        for row in Post.objects.filter(group__isnull=False).order_by()
+        .values('group').annotate(count=Count('id'), last=Max('pub_date'))
+    }
+    GroupStats.objects.all().delete()
+    GroupStats.objects.bulk_create(
+        GroupStats(
+            group_id=group_id,
+            posts_count=totals.get(group_id, {}).get('count', 0),
+            last_post_at=totals.get(group_id, {}).get('last'),
+            recent_authors=' '.join(recent_authors(group_id)),
+        )
+        for group_id in Group.objects.values_list('id', flat=True)
+    )
+    return len(totals)
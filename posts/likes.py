@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Like, LikeCounter
+
+
+def bump_counter(post_id, delta):
+    """Меняет случайный шард счетчика, чтобы писатели не ждали одну строку."""
+    shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+    counters = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if counters.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            LikeCounter.objects.create(post_id=post_id, shard=shard, count=delta)
+    except IntegrityError:
+        counters.update(count=F('count') + delta)
+
+
+def toggle_like(user, post):
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        if deleted:
+            bump_counter(post.id, -1)
+            return False
+        try:
+            with transaction.atomic():
+                Like.objects.create(user=user, post=post)
+        except IntegrityError:
+            # Параллельный запрос того же пользователя уже поставил лайк
+            # и учел его в счетчике.
+            return True
+        bump_counter(post.id, 1)
+    return True
+
+
+def remove_likes(batch):
+    """Удаляет пачку лайков и вычитает их из счетчиков постов."""
+    per_post = Counter(batch.values_list('post_id', flat=True))
+    batch.delete()
+    for post_id, count in per_post.items():
+        bump_counter(post_id, -count)
+    return []
+
+
+def attach_likes(posts, user):
+    """Проставляет постам likes_total и liked за два запроса на страницу."""
+    ids = [post.id for post in posts]
+    totals = dict(
+        LikeCounter.objects.filter(post_id__in=ids)
+        .values_list('post_id').annotate(total=Sum('count'))
+    )
+    liked = set()
+    if user.is_authenticated:
+        liked = set(
+            Like.objects.filter(user=user, post_id__in=ids)
+            .values_list('post_id', flat=True)
+        )
+    for post in posts:
+        post.likes_total = totals.get(post.id, 0)
+        post.liked = post.id in liked
+    return posts
@@ -0,0 +1,284 @@
+"""Живые обновления лент: издатель в Django и asyncio-сервер SSE.
+
+Django после коммита нового поста шлет датаграмму в Unix-сокет
+LIVE_SOCKET. Сервер (manage.py live_server) держит всех подписчиков в
+одном процессе с циклом asyncio: простаивающее соединение стоит одну
+корутину и не занимает воркер WSGI. Без сокета сервер сам опрашивает
+таблицу постов раз в LIVE_POLL_INTERVAL секунд.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+
+from .models import Follow, Post
+
+logger = logging.getLogger(__name__)
+
+# Столько же считает запасной live_count.
+BACKLOG_LIMIT = 100
+
+
+def event_for(post_id, author_id, group_slug):
+    return {'post': post_id, 'author': author_id, 'group': group_slug}
+
+
+def publish(event):
+    """Отправляет событие серверу; без сервера датаграмма просто теряется."""
+    if not settings.LIVE_SOCKET:
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.sendto(json.dumps(event).encode(), settings.LIVE_SOCKET)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def matches(scope, authors, event):
+    if scope == 'index':
+        return True
+    if scope == 'follow':
+        return event['author'] in authors
+    return scope == f'group:{event["group"]}'
+
+
+class Subscriber:
+    """Подписчик ленты: считает разные посты новее after."""
+
+    def __init__(self, scope, authors=None, after=0):
+        self.scope = scope
+        self.authors = authors or set()
+        self.after = after
+        self.seen = set()
+        self.wakeup = asyncio.Event()
+
+    @property
+    def new(self):
+        return len(self.seen)
+
+    def add(self, post_id):
+        if post_id > self.after and post_id not in self.seen:
+            self.seen.add(post_id)
+            self.wakeup.set()
+
+
+class Hub:
+    """Раздает события подписчикам своих лент."""
+
+    def __init__(self):
+        self.subscribers = set()
+
+    def add(self, subscriber):
+        self.subscribers.add(subscriber)
+
+    def remove(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        for subscriber in self.subscribers:
+            if matches(subscriber.scope, subscriber.authors, event):
+                subscriber.add(event['post'])
+
+
+class BrokerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        try:
+            self.hub.publish(json.loads(data))
+        except (ValueError, KeyError):
+            logger.warning('Некорректное событие: %r', data[:100])
+
+
+def new_events(after):
+    close_old_connections()
+    return [
+        event_for(*row) for row in
+        Post.objects.filter(id__gt=after).order_by('id')
+        .values_list('id', 'author_id', 'group__slug')[:1000]
+    ]
+
+
+def last_post_id():
+    close_old_connections()
+    post = Post.objects.order_by('-id').values_list('id', flat=True).first()
+    return post or 0
+
+
+async def poll(hub):
+    loop = asyncio.get_running_loop()
+    after = await loop.run_in_executor(None, last_post_id)
+    while True:
+        await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+        for event in await loop.run_in_executor(None, new_events, after):
+            hub.publish(event)
+            after = event['post']
+
+
+def followed_authors(session_key):
+    """Авторы, на которых подписан владелец сессии, или None для анонима.
+
+    Пользователь берется как в AuthenticationMiddleware: get_user сверяет
+    хеш пароля в сессии, так что после смены пароля сессия не действует.
+    """
+    close_old_connections()
+    engine = import_string(settings.SESSION_ENGINE + '.SessionStore')
+    request = HttpRequest()
+    request.session = engine(session_key)
+    user = get_user(request)
+    if not user.is_authenticated:
+        return None
+    return set(
+        Follow.objects.filter(user_id=user.pk).values_list('author_id', flat=True)
+    )
+
+
+def backlog(scope, authors, after):
+    """id постов ленты новее after, вышедших до подключения.
+
+    after приходит из отрисованной страницы, возможно взятой из кеша, —
+    тогда он лишь нижняя граница, и посты после него тоже новые для читателя.
+    """
+    close_old_connections()
+    posts = Post.objects.filter(id__gt=after)
+    if scope == 'follow':
+        posts = posts.filter(author_id__in=authors)
+    elif scope.startswith('group:'):
+        posts = posts.filter(group__slug=scope[len('group:'):])
+    return list(posts.order_by().values_list('id', flat=True)[:BACKLOG_LIMIT])
+
+
+def parse_cookies(header):
+    cookies = {}
+    for part in header.split(';'):
+        name, _, value = part.strip().partition('=')
+        cookies[name] = value
+    return cookies
+
+
+async def read_request(reader):
+    line = await reader.readline()
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, urlsplit(target), headers
+
+
+def response_head(status, content_type='text/plain; charset=utf-8'):
+    return (
+        f'HTTP/1.1 {status}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        'Cache-Control: no-cache\r\n'
+        'X-Accel-Buffering: no\r\n'
+        'Connection: close\r\n\r\n'
+    ).encode()
+
+
+async def serve_client(hub, reader, writer):
+    try:
+        # Клиент, который не присылает заголовки, не должен держать
+        # соединение вечно.
+        method, url, headers = await asyncio.wait_for(
+            read_request(reader), settings.LIVE_REQUEST_TIMEOUT
+        )
+        query = parse_qs(url.query)
+        scope = query.get('scope', [''])[0]
+        after = query.get('after', [''])[0]
+        if method != 'GET' or not (
+            scope in ('index', 'follow') or scope.startswith('group:')
+        ) or not (after == '' or after.isdigit()):
+            writer.write(response_head('400 Bad Request'))
+            return
+        loop = asyncio.get_running_loop()
+        authors = None
+        session_key = None
+        if scope == 'follow':
+            session_key = parse_cookies(headers.get('cookie', '')).get(
+                settings.SESSION_COOKIE_NAME
+            )
+            if session_key:
+                authors = await loop.run_in_executor(
+                    None, followed_authors, session_key
+                )
+            if authors is None:
+                writer.write(response_head('403 Forbidden'))
+                return
+        subscriber = Subscriber(scope, authors, int(after or 0))
+        hub.add(subscriber)
+        try:
+            writer.write(response_head('200 OK', 'text/event-stream'))
+            writer.write(f'retry: {settings.LIVE_RETRY_MS}\n\n'.encode())
+            await writer.drain()
+            if after:
+                # Подписчик уже в хабе: пост, вышедший во время запроса,
+                # придет и событием, и из базы, но посчитается один раз.
+                for post_id in await loop.run_in_executor(
+                    None, backlog, scope, authors, subscriber.after
+                ):
+                    subscriber.add(post_id)
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        subscriber.wakeup.wait(), settings.LIVE_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    if session_key:
+                        # Подписки могли измениться, а сессия — закончиться.
+                        authors = await loop.run_in_executor(
+                            None, followed_authors, session_key
+                        )
+                        if authors is None:
+                            return
+                        subscriber.authors = authors
+                    writer.write(b': ping\n\n')
+                else:
+                    subscriber.wakeup.clear()
+                    data = json.dumps({'new': subscriber.new})
+                    writer.write(f'event: posts\ndata: {data}\n\n'.encode())
+                await writer.drain()
+        finally:
+            hub.remove(subscriber)
+    except (
+        ConnectionError, ValueError, asyncio.IncompleteReadError,
+        asyncio.TimeoutError,
+    ):
+        pass
+    finally:
+        writer.close()
+
+
+async def run(host, port, socket_path=None):
+    hub = Hub()
+    loop = asyncio.get_running_loop()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        await loop.create_datagram_endpoint(
+            lambda: BrokerProtocol(hub),
+            local_addr=socket_path,
+            family=socket.AF_UNIX,
+        )
+    else:
+        loop.create_task(poll(hub))
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_client(hub, reader, writer), host, port
+    )
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,167 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.http import Http404
+
+from .archive import archived_count
+from .models import Follow, Group, Post, User
+from .paginator import cached_count
+from .tags import attach_links
+
+_groups = {}
+_expires = 0.0
+_lock = threading.Lock()
+
+
+def _load_groups():
+    global _expires
+    with _lock:
+        if not _groups or _expires <= time.monotonic():
+            _groups.clear()
+            for group in Group.objects.all():
+                _groups[group.slug] = group
+                _groups[group.id] = group
+            _expires = time.monotonic() + settings.GROUP_CACHE_TTL
+        return _groups
+
+
+def forget_groups():
+    with _lock:
+        _groups.clear()
+
+
+def cached_group(key):
+    """Сообщество по slug или id из памяти процесса.
+
+    Сообществ немного и меняются они редко: при первом обращении
+    загружаются все сразу. Сигналы сбрасывают кеш при записи в этом
+    процессе, остальные процессы перечитывают его раз в GROUP_CACHE_TTL
+    секунд; группу, созданную в другом процессе, промах дочитывает из БД.
+    """
+    group = _load_groups().get(key)
+    if group is None:
+        lookup = {'pk': key} if isinstance(key, int) else {'slug': key}
+        group = Group.objects.filter(**lookup).first()
+        if group is None:
+            return None
+        with _lock:
+            _groups[group.slug] = group
+            _groups[group.id] = group
+    return copy.copy(group)
+
+
+def _count(model, field):
+    return Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(n=Count('pk')).values('n'),
+        output_field=IntegerField(),
+    )
+
+
+class Loader:
+    """Карта идентичности на один запрос: каждая строка User, Group и
+    Post читается не больше одного раза, а связи постов указывают на
+    общие экземпляры."""
+
+    def __init__(self, request=None):
+        self.users = {}
+        self.usernames = {}
+        self.groups = {}
+        self.posts = {}
+        if request is not None and request.user.is_authenticated:
+            self.add_user(request.user)
+
+    def add_user(self, user):
+        self.users.setdefault(user.pk, user)
+        self.usernames.setdefault(user.username, self.users[user.pk])
+        return self.users[user.pk]
+
+    def group(self, slug=None, pk=None):
+        key = slug if slug is not None else pk
+        if key not in self.groups:
+            group = cached_group(key)
+            if group is None:
+                raise Http404
+            self.groups[group.slug] = self.groups[group.id] = group
+        return self.groups[key]
+
+    def author(self, username):
+        """Автор со счетчиками подписок и записей для user_info.html."""
+        user = self.usernames.get(username)
+        if user is None or not hasattr(user, 'follower_count'):
+            fetched = (
+                User.objects
+                .annotate(
+                    follower_count=_count(Follow, 'user'),
+                    following_count=_count(Follow, 'author'),
+                )
+                .filter(username=username)
+                .first()
+            )
+            if fetched is None:
+                raise Http404
+            if user is None:
+                user = self.add_user(fetched)
+            user.follower_count = fetched.follower_count or 0
+            user.following_count = fetched.following_count or 0
+        if not hasattr(user, 'posts_count'):
+            user.hot_posts_count = cached_count(
+                f'author:{user.id}', user.posts.all()
+            )
+            user.posts_count = user.hot_posts_count + archived_count(user.id)
+        return user
+
+    def post(self, post_id, username):
+        """Пост по первичному ключу; username из URL лишь проверяется."""
+        post = self.posts.get(post_id)
+        if post is None:
+            user = self.usernames.get(username)
+            queryset = Post.objects.all()
+            if user is None:
+                queryset = queryset.select_related('author')
+            post = queryset.filter(pk=post_id).first()
+            if post is None:
+                raise Http404
+            self.posts[post_id] = post
+            self.attach([post])
+        if post.author.username != username:
+            raise Http404
+        return post
+
+    def attach(self, posts):
+        """Подставляет в посты общих авторов и сообщества из кешей.
+
+        Заодно проверяет для всей страницы ссылки #тегов и @упоминаний.
+        """
+        posts = attach_links(posts)
+        missing = {
+            post.author_id for post in posts
+            if post.author_id not in self.users
+            and not Post.author.is_cached(post)
+        }
+        if missing:
+            for user in User.objects.filter(pk__in=missing):
+                self.add_user(user)
+        for post in posts:
+            self.posts.setdefault(post.pk, post)
+            if Post.author.is_cached(post):
+                Post.author.field.set_cached_value(post, self.add_user(post.author))
+            else:
+                Post.author.field.set_cached_value(post, self.users[post.author_id])
+            if post.group_id is not None:
+                try:
+                    group = self.group(pk=post.group_id)
+                except Http404:
+                    continue
+                Post.group.field.set_cached_value(post, group)
+        return posts
+
+
+def get_loader(request):
+    loader = getattr(request, '_loader', None)
+    if loader is None:
+        loader = request._loader = Loader(request)
+    return loader
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.archive import archive
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые посты и их комментарии в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+            help='архивировать посты старше стольких дней',
+        )
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--pause', type=float, default=settings.ARCHIVE_PAUSE,
+            help='пауза между пачками, секунд',
+        )
+
+    def handle(self, *args, **options):
+        total = archive(
+            options['days'],
+            options['batch_size'],
+            options['pause'],
+            progress=lambda done: self.stdout.write(f'Перенесено: {done}'),
+        )
+        self.stdout.write(f'Всего в архив: {total}')
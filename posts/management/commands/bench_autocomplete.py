@@ -0,0 +1,51 @@
+import random
+import string
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from posts.autocomplete import PrefixIndex
+
+
+class Command(BaseCommand):
+    help = 'Замеряет построение и поиск префиксного индекса на синтетических именах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        alphabet = string.ascii_lowercase + string.digits + '_'
+        names = [
+            ''.join(rnd.choices(alphabet, k=rnd.randint(4, 15)))
+            for _ in range(options['users'])
+        ]
+        items = [(pk, name, name) for pk, name in enumerate(names, 1)]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = PrefixIndex(items)
+        built = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        prefixes = [
+            rnd.choice(names)[:rnd.randint(1, 4)] for _ in range(options['queries'])
+        ]
+        started = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix, 10)
+        search = (time.perf_counter() - started) / len(prefixes)
+
+        started = time.perf_counter()
+        for pk in range(len(names) + 1, len(names) + 1001):
+            index.add(pk, f'new{pk}', f'new{pk}')
+        insert = (time.perf_counter() - started) / 1000
+
+        self.stdout.write(f'Записей: {len(index)}')
+        self.stdout.write(f'Построение: {built:.2f} с, память: {memory / 2**20:.0f} МиБ')
+        self.stdout.write(f'Поиск: {search * 1e6:.1f} мкс')
+        self.stdout.write(f'Вставка: {insert * 1e6:.1f} мкс')
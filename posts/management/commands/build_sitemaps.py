@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.sitemaps import build
+
+
+class Command(BaseCommand):
+    help = 'Обновляет файлы sitemap для изменившихся постов, авторов и групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+
+    def handle(self, *args, **options):
+        written = build(full=options['full'])
+        self.stdout.write(f'Переписано файлов: {written}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Строит рекомендации, на кого подписаться, по графу подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int)
+        parser.add_argument('--workers', type=int)
+
+    def handle(self, *args, **options):
+        users = rebuild(options['limit'], options['workers'])
+        self.stdout.write(f'Рекомендации обновлены для {users} пользователей')
@@ -0,0 +1,30 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.dump import MODELS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгружает пользователей, группы, посты, комментарии и подписки в JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл или - для stdout')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        querysets = [model._base_manager.all() for model in MODELS]
+        if path == '-':
+            out = sys.stdout
+        elif options['gzip'] or path.endswith('.gz'):
+            out = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            out = open(path, 'w', encoding='utf-8')
+        try:
+            out.writelines(export_lines(querysets, options['chunk_size']))
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,33 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки, на которые не ссылается ни один пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=3600,
+            help='не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        refs = Post.image_references()
+        border = timezone.now() - dt.timedelta(seconds=options['grace'])
+        removed = freed = 0
+        for name in storage.walk('posts'):
+            if name in refs or storage.get_modified_time(name) > border:
+                continue
+            removed += 1
+            freed += storage.size(name)
+            if not options['dry_run']:
+                storage.delete_blob(name)
+        self.stdout.write(f'Удалено файлов: {removed}, освобождено байт: {freed}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько места экономит дедупликация картинок'
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = blobs = stored = logical = 0
+        for name, refs in Post.image_references().items():
+            if not storage.exists(name):
+                continue
+            size = storage.size(name)
+            posts += refs
+            blobs += 1
+            stored += size
+            logical += size * refs
+        self.stdout.write(f'Постов с картинками: {posts}')
+        self.stdout.write(f'Уникальных файлов: {blobs}')
+        self.stdout.write(f'Занято байт: {stored}')
+        self.stdout.write(f'Сэкономлено байт: {logical - stored}')
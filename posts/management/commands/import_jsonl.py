@@ -0,0 +1,32 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.dump import import_lines
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку export_jsonl пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл или - для stdin')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            source = sys.stdin
+        elif path.endswith('.gz'):
+            source = gzip.open(path, 'rt', encoding='utf-8')
+        else:
+            source = open(path, encoding='utf-8')
+        try:
+            with transaction.atomic():
+                imported = import_lines(source, options['batch_size'])
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for model, count in imported.items():
+            self.stdout.write(f'{model._meta.label}: {count}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.tags import backfill
+
+
+class Command(BaseCommand):
+    help = 'Размечает теги и упоминания во всех постах порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        done = backfill(options['batch_size'])
+        self.stdout.write(f'Размечено постов: {done}')
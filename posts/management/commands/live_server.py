@@ -0,0 +1,28 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.live import run
+
+
+class Command(BaseCommand):
+    help = 'Запускает сервер живых обновлений лент (server-sent events)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.LIVE_HOST)
+        parser.add_argument('--port', type=int, default=settings.LIVE_PORT)
+        parser.add_argument(
+            '--socket', default=settings.LIVE_SOCKET,
+            help='Unix-сокет для событий; без него таблица постов опрашивается',
+        )
+
+    def handle(self, *args, **options):
+        mode = options['socket'] or 'опрос БД'
+        self.stdout.write(
+            f'Слушаю {options["host"]}:{options["port"]}, события: {mode}'
+        )
+        try:
+            asyncio.run(run(options['host'], options['port'], options['socket']))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.prerender import publish
+
+
+class Command(BaseCommand):
+    help = 'Перерисовывает первые страницы лент для анонимных посетителей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='все ленты, а не только измененные')
+        parser.add_argument('--loop', action='store_true')
+        parser.add_argument(
+            '--interval', type=float, default=settings.PRERENDER_INTERVAL
+        )
+
+    def handle(self, *args, **options):
+        everything = options['all']
+        while True:
+            done = publish(everything)
+            self.stdout.write(f'Перерисовано лент: {done}')
+            if not options['loop']:
+                break
+            everything = False
+            time.sleep(options['interval'])
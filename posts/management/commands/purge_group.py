@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Group
+from posts.purge import Purger
+
+
+class Command(BaseCommand):
+    help = 'Удаляет группу, отвязывая от нее записи порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--max-lock', type=float)
+
+    def handle(self, *args, **options):
+        try:
+            group = Group.objects.get(slug=options['slug'])
+        except Group.DoesNotExist:
+            raise CommandError(f'Группа {options["slug"]} не найдена')
+        purger = Purger(
+            batch_size=options['batch_size'],
+            max_lock=options['max_lock'],
+            progress=self.progress,
+        )
+        purger.purge_group(group)
+        self.stdout.write(self.style.SUCCESS(f'Группа {group} удалена'))
+
+    def progress(self, label, done):
+        self.stdout.write(f'{label}: {done}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import User
+from posts.purge import Purger
+
+
+class Command(BaseCommand):
+    help = 'Удаляет пользователя и все его записи порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--max-lock', type=float)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["username"]} не найден')
+        purger = Purger(
+            batch_size=options['batch_size'],
+            max_lock=options['max_lock'],
+            progress=self.progress,
+        )
+        purger.purge_user(user)
+        self.stdout.write(self.style.SUCCESS(f'Пользователь {user} удален'))
+
+    def progress(self, label, done):
+        self.stdout.write(f'{label}: {done}')
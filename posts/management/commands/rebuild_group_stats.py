@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.groupstats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводку по сообществам для каталога /groups/'
+
+    def handle(self, *args, **options):
+        groups = rebuild()
+        self.stdout.write(f'Сообществ с записями: {groups}')
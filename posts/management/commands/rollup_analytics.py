@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.analytics import rollup
+
+
+class Command(BaseCommand):
+    help = 'Дополняет дневные сводки новыми постами и комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--loop', action='store_true')
+        parser.add_argument(
+            '--interval', type=float, default=settings.ROLLUP_INTERVAL
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            while rollup(options['batch_size']):
+                pass
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Компилирует шаблоны, строит маршруты и прогревает горячие страницы'
+
+    def handle(self, *args, **options):
+        templates, patterns, urls = warm_up()
+        self.stdout.write(f'Шаблонов: {templates}')
+        self.stdout.write(f'Маршрутов: {patterns}')
+        for url in urls:
+            self.stdout.write(f'Прогрета страница {url}')
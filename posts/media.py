@@ -0,0 +1,146 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# Блобы ContentAddressedStorage и миниатюры sorl названы хешем содержимого.
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{32,64}\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Отдает только байты [start, start + length) открытого файла.
+
+    Оставляет ``fileno``, чтобы wsgi.file_wrapper сервера (например,
+    gunicorn) мог отправить диапазон через os.sendfile без копирования.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = min(int(last), size)
+        if length == 0:
+            # bytes=-0 или пустой файл: такой диапазон невыполним.
+            raise ValueError
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError
+    return start, end - start + 1
+
+
+def cache_headers(response, path, etag, mtime):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if HASHED_NAME.search(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return response
+
+
+def offload(internal_url, fullpath):
+    response = HttpResponse(content_type='')
+    if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = internal_url
+    else:
+        response['X-Sendfile'] = fullpath
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, root, path, accel_prefix=None):
+    fullpath = safe_join(root, path)
+    try:
+        info = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+    mtime = int(info.st_mtime)
+    etag = quote_etag(f'{info.st_mtime_ns:x}-{info.st_size:x}')
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=mtime
+    )
+    if conditional is not None:
+        return cache_headers(conditional, path, etag, mtime)
+
+    if settings.MEDIA_OFFLOAD and accel_prefix is not None:
+        response = offload(accel_prefix + path, fullpath)
+        return cache_headers(response, path, etag, mtime)
+
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+    size = info.st_size
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and (
+        if_range is None
+        or if_range == etag
+        or parse_http_date_safe(if_range) == mtime
+    ):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return cache_headers(response, path, etag, mtime)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+        return cache_headers(response, path, etag, mtime)
+
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, length = byte_range
+        response = FileResponse(
+            FileRange(file, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    return cache_headers(response, path, etag, mtime)
+
+
+@require_safe
+def serve(request, path):
+    return serve_file(
+        request, settings.MEDIA_ROOT, path, settings.MEDIA_ACCEL_PREFIX
+    )
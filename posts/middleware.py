@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .prerender import prerendered_file
+
+
+class PrerenderMiddleware:
+    """Отдает анонимам заранее отрисованные страницы лент, пока они свежие."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        found = prerendered_file(request)
+        if found is None:
+            return self.get_response(request)
+        path, gz = found
+        with open(path, 'rb') as f:
+            response = HttpResponse(f.read(), content_type='text/html; charset=utf-8')
+        if gz:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        return response
+
+
+class LoadShedder:
+    """AIMD-лимит одновременных запросов процесса.
+
+    Быстрый ответ поднимает лимит на 1/limit, медленный (дольше
+    SHED_TARGET_LATENCY) урезает его в SHED_DECREASE раз. Запросам низкого
+    приоритета достается только доля SHED_LOW_FRACTION лимита. Пока ответов
+    нет (все отклонены), лимит растет на 1 за каждые SHED_RECOVER_AFTER
+    секунд.
+
+    Синхронный воркер выполняет один запрос за раз, и своих запросов в
+    полете у него при admit всегда ноль. Поэтому, если задан
+    SHED_SHARED_DIR, каждый процесс пишет туда файл <pid> со своим числом
+    запросов в полете, и лимит сравнивается с суммой по всем живым
+    процессам. Без него считаются только потоки своего процесса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.limit = float(settings.SHED_INITIAL_LIMIT)
+        self.updated = time.monotonic()
+        self.routes = defaultdict(
+            lambda: {'latency': 0.0, 'requests': 0, 'rejected': 0}
+        )
+
+    def floor(self):
+        return max(1.0, 1 / settings.SHED_LOW_FRACTION)
+
+    def recover(self, now):
+        idle = now - self.updated
+        if idle >= settings.SHED_RECOVER_AFTER:
+            self.limit = min(
+                float(settings.SHED_MAX_LIMIT),
+                self.limit + idle / settings.SHED_RECOVER_AFTER,
+            )
+            self.updated = now
+
+    def others(self):
+        """Запросы в полете у остальных процессов из SHED_SHARED_DIR."""
+        directory = settings.SHED_SHARED_DIR
+        if not directory:
+            return 0
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return 0
+        total = 0
+        for name in names:
+            if not name.isdigit() or int(name) == os.getpid():
+                continue
+            path = os.path.join(directory, name)
+            try:
+                os.kill(int(name), 0)
+            except ProcessLookupError:
+                # Воркер умер посреди запроса: его счетчик больше не в силе.
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    total += int(f.read() or 0)
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def publish(self):
+        directory = settings.SHED_SHARED_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, str(os.getpid()))
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(str(self.inflight))
+        os.replace(f'{path}.tmp', path)
+
+    def admit(self, route, priority):
+        with self.lock:
+            self.recover(time.monotonic())
+            if priority == 'low':
+                allowed = self.limit * settings.SHED_LOW_FRACTION
+            else:
+                allowed = self.limit
+            inflight = self.inflight + self.others()
+            if priority != 'protected' and inflight + 1 > allowed:
+                self.routes[route]['rejected'] += 1
+                return False
+            self.inflight += 1
+            self.publish()
+            return True
+
+    def release(self, route, latency):
+        with self.lock:
+            self.inflight -= 1
+            self.publish()
+            stats = self.routes[route]
+            stats['requests'] += 1
+            stats['latency'] += (latency - stats['latency']) * settings.SHED_EWMA_ALPHA
+            if latency > settings.SHED_TARGET_LATENCY:
+                self.limit = max(self.floor(), self.limit * settings.SHED_DECREASE)
+            else:
+                self.limit = min(
+                    float(settings.SHED_MAX_LIMIT), self.limit + 1 / self.limit
+                )
+            self.updated = time.monotonic()
+
+    def state(self):
+        with self.lock:
+            return {
+                'limit': round(self.limit, 2),
+                'inflight': self.inflight,
+                'routes': {
+                    route: {
+                        'latency_ms': round(stats['latency'] * 1000, 1),
+                        'requests': stats['requests'],
+                        'rejected': stats['rejected'],
+                    }
+                    for route, stats in self.routes.items()
+                },
+            }
+
+
+load_shedder = LoadShedder()
+
+
+def request_priority(request, route):
+    if request.method not in ('GET', 'HEAD') or route in settings.SHED_PROTECTED:
+        return 'protected'
+    if route in settings.SHED_LOW_PRIORITY:
+        return 'low'
+    page = request.GET.get('page', '')
+    if page.isdigit() and int(page) > settings.SHED_DEEP_PAGE:
+        return 'low'
+    return 'normal'
+
+
+class LoadSheddingMiddleware:
+    """Под перегрузкой отвечает 503 на неважные запросы, пока не стало поздно."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.monotonic()
+        response = self.get_response(request)
+        route = getattr(request, '_shed_route', None)
+        if route is not None:
+            load_shedder.release(route, time.monotonic() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.url_name or request.resolver_match.view_name
+        if not load_shedder.admit(route, request_priority(request, route)):
+            response = HttpResponse('Сервер перегружен, попробуйте позже', status=503)
+            response['Retry-After'] = settings.SHED_RETRY_AFTER
+            return response
+        request._shed_route = route
+        return None
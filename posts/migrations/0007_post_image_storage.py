@@ -0,0 +1,19 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:01
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_follow'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='добавь картинку', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='пикча'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='views',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='просмотры'),
+        ),
+    ]
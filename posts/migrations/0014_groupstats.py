@@ -0,0 +1,68 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def recent_authors(Post, group_id):
+    names = []
+    rows = (
+        Post.objects.filter(group_id=group_id).order_by('-pub_date')
+        .values_list('author__username', flat=True)[:50]
+    )
+    for name in rows:
+        if name not in names and len(names) < 5:
+            names.append(name)
+    return names
+
+
+def fill_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    Post = apps.get_model('posts', 'Post')
+    totals = {
+        row['group']: row
+        for row in Post.objects.filter(group__isnull=False).order_by()
+        .values('group').annotate(count=Count('id'), last=Max('pub_date'))
+    }
+    GroupStats.objects.bulk_create(
+        GroupStats(
+            group_id=group_id,
+            posts_count=totals.get(group_id, {}).get('count', 0),
+            last_post_at=totals.get(group_id, {}).get('last'),
+            recent_authors=' '.join(recent_authors(Post, group_id)),
+        )
+        for group_id in Group.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='группа')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='записей')),
+                ('last_post_at', models.DateTimeField(blank=True, null=True, verbose_name='последняя запись')),
+                ('recent_authors', models.CharField(blank=True, default='', max_length=1000, verbose_name='недавние авторы')),
+            ],
+            options={
+                'ordering': ['-last_post_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='posts_post_group_i_1fdac4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-last_post_at'], name='posts_group_last_po_6ea643_idx'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
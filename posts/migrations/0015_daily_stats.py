@@ -0,0 +1,54 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_groupstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='день')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='записей')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='комментариев')),
+                ('active_authors', models.PositiveIntegerField(default=0, verbose_name='активных авторов')),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyGroupStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='записей')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='комментариев')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='группа')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('day', 'group')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='автор')),
+            ],
+            options={
+                'unique_together': {('day', 'author')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_watermark(apps, schema_editor):
+    # Без отметки первый fan_out разослал бы уведомления обо всех старых
+    # постах; рассылка начинается с постов, созданных после миграции.
+    Post = apps.get_model('posts', 'Post')
+    Watermark = apps.get_model('posts', 'Watermark')
+    last = Post.objects.aggregate(last=Max('id'))['last'] or 0
+    Watermark.objects.get_or_create(
+        name='notifications', defaults={'position': last}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_watermark, migrations.RunPython.noop),
+    ]
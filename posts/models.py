@@ -1,5 +1,10 @@
+from collections import Counter
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Count
+
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -14,10 +19,13 @@ class Group(models.Model):
 
 
 class Post(models.Model):
+    archived = False
+
     text = models.TextField(verbose_name='текст', help_text='напиши свой пост здесь',)
     pub_date = models.DateTimeField(
         'дата публикации',
         auto_now_add=True,
+        db_index=True,
     )
     author = models.ForeignKey(
         User,
@@ -36,14 +44,37 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=image_storage,
         verbose_name='пикча',
         help_text='добавь картинку',
         blank=True,
         null=True
         )
+    views = models.PositiveIntegerField('просмотры', default=0, db_index=True)
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [models.Index(fields=['group', '-pub_date'])]
+
+    @staticmethod
+    def image_references():
+        refs = Counter()
+        for model in (Post, ArchivedPost):
+            refs.update(dict(
+                model.objects.exclude(image='').exclude(image__isnull=True)
+                .order_by().values_list('image').annotate(refs=Count('id'))
+            ))
+        return dict(refs)
+
+    def save(self, *args, **kwargs):
+        # Просмотры пишет только ViewCounter.flush через F(); полное
+        # сохранение загруженного раньше поста затерло бы его прибавки.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'views'
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         author = self.author
@@ -88,3 +119,309 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+
+class Watermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
+
+    @classmethod
+    def get(cls, name):
+        return cls.objects.get_or_create(name=name)[0]
+
+    def read_after(self, queryset, fields, batch_size):
+        """Следующая пачка (id, *fields) из queryset после отметки.
+
+        Отметка сдвигается на последний прочитанный id; вызывать в той же
+        транзакции, что и обработку строк.
+        """
+        rows = list(
+            queryset.filter(id__gt=self.position).order_by('id')
+            .values_list('id', *fields)[:batch_size]
+        )
+        if rows:
+            self.position = rows[-1][0]
+            self.save()
+        return rows
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='получатель',
+        on_delete=models.CASCADE,
+        related_name='notifications',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор новых постов',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    posts_count = models.PositiveIntegerField('новых постов', default=0)
+    last_post = models.ForeignKey(
+        Post,
+        verbose_name='последний пост',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    updated = models.DateTimeField('обновлено')
+    is_read = models.BooleanField('прочитано', default=False)
+
+    class Meta:
+        ordering = ['-updated']
+        indexes = [models.Index(fields=['user', 'is_read'])]
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='кто лайкнул',
+        on_delete=models.CASCADE,
+        related_name='likes',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='likes',
+    )
+    created = models.DateTimeField('дата лайка', auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'post')
+
+
+class LikeCounter(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+    )
+    shard = models.PositiveSmallIntegerField('шард')
+    count = models.IntegerField('лайков', default=0)
+
+    class Meta:
+        unique_together = ('post', 'shard')
+
+
+class PostScore(models.Model):
+    post = models.OneToOneField(
+        Post,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='score',
+        primary_key=True,
+    )
+    group = models.ForeignKey(
+        Group,
+        verbose_name='группа',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    score = models.FloatField('рейтинг', default=0)
+    views_seen = models.PositiveIntegerField('учтено просмотров', default=0)
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['-score']),
+            models.Index(fields=['group', '-score']),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='кому предлагаем',
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+    )
+    suggested = models.ForeignKey(
+        User,
+        verbose_name='на кого подписаться',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.PositiveIntegerField('общих подписок', default=0)
+    rank = models.PositiveSmallIntegerField('место')
+
+    class Meta:
+        ordering = ['rank']
+        unique_together = ('user', 'rank')
+
+
+class GroupStats(models.Model):
+    group = models.OneToOneField(
+        Group,
+        verbose_name='группа',
+        on_delete=models.CASCADE,
+        related_name='stats',
+        primary_key=True,
+    )
+    posts_count = models.IntegerField('записей', default=0)
+    last_post_at = models.DateTimeField('последняя запись', blank=True, null=True)
+    recent_authors = models.CharField(
+        'недавние авторы', max_length=1000, blank=True, default=''
+    )
+
+    class Meta:
+        ordering = ['-last_post_at']
+        indexes = [models.Index(fields=['-last_post_at'])]
+
+    def authors(self):
+        return self.recent_authors.split()
+
+
+class DailyStats(models.Model):
+    day = models.DateField('день', unique=True)
+    posts = models.PositiveIntegerField('записей', default=0)
+    comments = models.PositiveIntegerField('комментариев', default=0)
+    active_authors = models.PositiveIntegerField('активных авторов', default=0)
+
+    class Meta:
+        ordering = ['-day']
+
+
+class DailyGroupStats(models.Model):
+    day = models.DateField('день')
+    group = models.ForeignKey(
+        Group,
+        verbose_name='группа',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    posts = models.PositiveIntegerField('записей', default=0)
+    comments = models.PositiveIntegerField('комментариев', default=0)
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ('day', 'group')
+
+
+class DailyAuthor(models.Model):
+    day = models.DateField('день')
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        unique_together = ('day', 'author')
+
+
+class Tag(models.Model):
+    name = models.CharField('тег', max_length=64, unique=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+    )
+    tag = models.ForeignKey(
+        Tag,
+        verbose_name='тег',
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+    )
+
+    class Meta:
+        unique_together = ('post', 'tag')
+        indexes = [models.Index(fields=['tag', '-post'])]
+
+
+class Mention(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='упомянутый пользователь',
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+
+    class Meta:
+        unique_together = ('post', 'user')
+        indexes = [models.Index(fields=['user', '-post'])]
+
+
+class ArchivedPost(models.Model):
+    """Старый пост, перенесенный из posts_post архивацией.
+
+    Сохраняет id исходного поста, поэтому старые ссылки продолжают работать.
+    """
+    archived = True
+
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='текст')
+    pub_date = models.DateTimeField('дата публикации')
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор',
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+    )
+    group = models.ForeignKey(
+        Group,
+        verbose_name='группа',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    image = models.ImageField(
+        upload_to='posts/',
+        storage=image_storage,
+        verbose_name='пикча',
+        blank=True,
+        null=True,
+    )
+    views = models.PositiveIntegerField('просмотры', default=0)
+    likes_total = models.PositiveIntegerField('лайков', default=0)
+    archived_at = models.DateTimeField('архивирован', auto_now_add=True)
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [models.Index(fields=['author', '-pub_date'])]
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        verbose_name='пост',
+        on_delete=models.CASCADE,
+        related_name='comments',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор коммента',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    text = models.TextField(verbose_name='текст коммента')
+    created = models.DateTimeField('дата публикации комментария')
+
+    class Meta:
+        ordering = ['created']
@@ -0,0 +1,89 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Follow, Notification, Post, Watermark
+
+UNREAD_KEY = 'notifications:unread:{}'
+
+
+def unread_count(user_id):
+    key = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            user_id=user_id, is_read=False
+        ).aggregate(total=Sum('posts_count'))['total'] or 0
+        cache.set(key, count, settings.NOTIFICATIONS_COUNT_TTL)
+    return count
+
+
+def mark_read(user_id):
+    Notification.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+    cache.delete(UNREAD_KEY.format(user_id))
+
+
+def fan_out(batch_size=None):
+    """Раскладывает новые посты подписчикам их авторов.
+
+    Берет посты после водяной отметки, группирует по авторам и для каждого
+    подписчика дополняет непрочитанную сводку по автору или заводит новую.
+    Возвращает число обработанных постов.
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_BATCH_SIZE
+    with transaction.atomic():
+        posts = Watermark.get('notifications').read_after(
+            Post.objects.all(), ['author_id', 'pub_date'], batch_size
+        )
+        if not posts:
+            return 0
+        digests = {}
+        for post_id, author_id, pub_date in posts:
+            count = digests.get(author_id, (0,))[0]
+            digests[author_id] = (count + 1, post_id, pub_date)
+
+        follows = Follow.objects.filter(author_id__in=digests).values_list(
+            'user_id', 'author_id'
+        ).iterator()
+        touched = set()
+        while True:
+            chunk = list(islice(follows, settings.NOTIFICATIONS_BATCH_SIZE))
+            if not chunk:
+                break
+            touched.update(user_id for user_id, _ in chunk)
+            apply_digests(chunk, digests)
+    cache.delete_many([UNREAD_KEY.format(user_id) for user_id in touched])
+    return len(posts)
+
+
+def apply_digests(follows, digests):
+    existing = {
+        (item.user_id, item.author_id): item
+        for item in Notification.objects.filter(
+            user_id__in={user_id for user_id, _ in follows},
+            author_id__in={author_id for _, author_id in follows},
+            is_read=False,
+        )
+    }
+    created, changed = [], []
+    for user_id, author_id in follows:
+        count, post_id, pub_date = digests[author_id]
+        item = existing.get((user_id, author_id))
+        if item is None:
+            created.append(Notification(
+                user_id=user_id,
+                author_id=author_id,
+                posts_count=count,
+                last_post_id=post_id,
+                updated=pub_date,
+            ))
+        else:
+            item.posts_count += count
+            item.last_post_id = post_id
+            item.updated = pub_date
+            changed.append(item)
+    Notification.objects.bulk_create(created)
+    Notification.objects.bulk_update(changed, ['posts_count', 'last_post', 'updated'])
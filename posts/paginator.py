@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+COUNT_KEY = 'posts:count:{}'
+
+
+def cached_count(scope, queryset):
+    """Число постов в ленте из кеша.
+
+    Записи сдвигают закешированные значения через adjust_count. Точный
+    COUNT(*) повторяется через POSTS_COUNT_TTL секунд, а для лент больше
+    POSTS_COUNT_EXACT_LIMIT — лишь раз в POSTS_COUNT_ESTIMATE_TTL: между
+    пересчетами число оценочное.
+    """
+    key = COUNT_KEY.format(scope)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        if count < settings.POSTS_COUNT_EXACT_LIMIT:
+            timeout = settings.POSTS_COUNT_TTL
+        else:
+            timeout = settings.POSTS_COUNT_ESTIMATE_TTL
+        cache.set(key, count, timeout)
+    return max(count, 0)
+
+
+def adjust_count(scopes, delta):
+    for scope in scopes:
+        try:
+            cache.incr(COUNT_KEY.format(scope), delta)
+        except ValueError:
+            pass
+
+
+def posts_paginator(queryset, scope, per_page=10):
+    paginator = Paginator(queryset, per_page)
+    paginator.count = cached_count(scope, queryset)
+    return paginator
+
+
+class ChainedList:
+    """Две упорядоченные выборки подряд как один список для Paginator.
+
+    Счетчики first_count и second_count (обычно из кеша) влияют только на
+    число страниц. Какие строки попадут на страницу, решают сами выборки:
+    граница между ними берется из числа реально вернувшихся строк первой,
+    а если срез целиком за ее концом — из точного COUNT по индексу.
+    """
+
+    def __init__(self, first, first_count, second, second_count):
+        self.first = first
+        self.first_count = first_count
+        self.second = second
+        self.second_count = second_count
+
+    def count(self):
+        return self.first_count + self.second_count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        start, stop = key.start or 0, key.stop
+        items = list(self.first[start:stop])
+        if len(items) < stop - start:
+            if items:
+                boundary = start + len(items)
+            else:
+                boundary = self.first.count()
+            items.extend(
+                self.second[max(start - boundary, 0):stop - boundary]
+            )
+        return items
+
+
+def keyset_page(queryset, before=None, per_page=10):
+    """Страница ленты по ключу: посты с id меньше before, новые сверху.
+
+    В отличие от OFFSET стоимость не растет с глубиной ленты. Возвращает
+    посты и ключ следующей страницы (None, если она последняя).
+    """
+    queryset = queryset.order_by('-id')
+    if before:
+        queryset = queryset.filter(id__lt=before)
+    posts = list(queryset[:per_page + 1])
+    if len(posts) > per_page:
+        return posts[:per_page], posts[per_page - 1].id
+    return posts, None
+
+
+def elided_range(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям; None — пропуск."""
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > 1 + on_each_side + on_ends + 1:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
@@ -0,0 +1,168 @@
+import gzip
+import math
+import os
+import time
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve, reverse
+
+from .models import Group, Post, User
+
+FEEDS = ('index', 'group', 'profile')
+
+
+def scope_url(scope):
+    name, _, arg = scope.partition(':')
+    return reverse(name, args=[arg] if arg else [])
+
+
+def scope_posts(scope):
+    name, _, arg = scope.partition(':')
+    if name == 'group':
+        return Post.objects.filter(group__slug=arg)
+    if name == 'profile':
+        return Post.objects.filter(author__username=arg)
+    return Post.objects.all()
+
+
+def page_file(url, number, gz=False):
+    """Файл страницы ленты внутри PRERENDER_ROOT.
+
+    Сегменты URL (имена пользователей, slug) приводятся к одному виду и
+    экранируются; путь, который вышел бы за PRERENDER_ROOT, — ValueError.
+    """
+    segments = [
+        quote(unquote(segment), safe='@+-_.')
+        for segment in url.strip('/').split('/') if segment
+    ]
+    if any(segment in ('.', '..') for segment in segments):
+        raise ValueError(url)
+    root = os.path.realpath(settings.PRERENDER_ROOT)
+    name = f'page-{number}.html' + ('.gz' if gz else '')
+    path = os.path.join(root, *segments, name)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(url)
+    return path
+
+
+def post_scopes(post, old_group_id=None):
+    scopes = ['index', f'profile:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    if old_group_id is not None and old_group_id != post.group_id:
+        old = Group.objects.filter(pk=old_group_id).values_list('slug', flat=True)
+        scopes.extend(f'group:{slug}' for slug in old)
+    return scopes
+
+
+def dirty_dir():
+    return os.path.join(settings.PRERENDER_ROOT, '.dirty')
+
+
+def enabled():
+    """Пререндер включен, когда каталог PRERENDER_ROOT создан."""
+    return os.path.isdir(settings.PRERENDER_ROOT)
+
+
+def mark_dirty(scopes):
+    """Убирает устаревшие страницы и ставит ленты в очередь на перерисовку."""
+    os.makedirs(dirty_dir(), exist_ok=True)
+    for scope in scopes:
+        url = scope_url(scope)
+        for number in range(1, settings.PRERENDER_PAGES + 1):
+            for gz in (False, True):
+                try:
+                    os.remove(page_file(url, number, gz))
+                except (FileNotFoundError, ValueError):
+                    pass
+        open(os.path.join(dirty_dir(), scope), 'w').close()
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def render_scope(scope):
+    url = scope_url(scope)
+    try:
+        page_file(url, 1)
+    except ValueError:
+        return
+    match = resolve(url)
+    view = getattr(match.func, '__wrapped__', match.func)
+    pages = math.ceil(scope_posts(scope).count() / 10) or 1
+    factory = RequestFactory()
+    for number in range(1, min(pages, settings.PRERENDER_PAGES) + 1):
+        request = factory.get(url, {'page': number} if number > 1 else {})
+        request.user = AnonymousUser()
+        response = view(request, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            return
+        content = response.content
+        write_atomic(page_file(url, number, gz=True), gzip.compress(content))
+        write_atomic(page_file(url, number), content)
+
+
+def all_scopes():
+    yield 'index'
+    for slug in Group.objects.values_list('slug', flat=True).iterator():
+        yield f'group:{slug}'
+    authors = User.objects.filter(posts__isnull=False).distinct()
+    for username in authors.values_list('username', flat=True).iterator():
+        yield f'profile:{username}'
+
+
+def dirty_scopes():
+    try:
+        return os.listdir(dirty_dir())
+    except FileNotFoundError:
+        return []
+
+
+def publish(everything=False):
+    """Перерисовывает помеченные (или все) ленты; возвращает их число."""
+    os.makedirs(settings.PRERENDER_ROOT, exist_ok=True)
+    done = 0
+    scopes = all_scopes() if everything else dirty_scopes()
+    for scope in scopes:
+        try:
+            os.remove(os.path.join(dirty_dir(), scope))
+        except FileNotFoundError:
+            pass
+        render_scope(scope)
+        done += 1
+    return done
+
+
+def prerendered_file(request):
+    """Путь к свежему файлу для анонимного GET-запроса ленты или None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return None
+    if set(request.GET) - {'page'}:
+        return None
+    number = request.GET.get('page', '1')
+    if not number.isdigit() or not 1 <= int(number) <= settings.PRERENDER_PAGES:
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if match.url_name not in FEEDS:
+        return None
+    gz = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    try:
+        path = page_file(request.path_info, int(number), gz)
+        mtime = os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    if time.time() - mtime > settings.PRERENDER_MAX_AGE:
+        return None
+    return path, gz
@@ -0,0 +1,102 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .likes import remove_likes
+from .models import ArchivedComment, ArchivedPost, Comment, Follow, Like, Post
+
+
+class Purger:
+    """Удаляет пользователя или группу вместе с зависимыми записями порциями.
+
+    Каждая порция удаляется в своей короткой транзакции; если транзакция
+    заняла больше ``max_lock`` секунд, порция уменьшается вдвое. Повторный
+    запуск продолжает с того места, где работа была прервана.
+    """
+
+    def __init__(self, batch_size=None, max_lock=None, progress=None):
+        self.batch_size = batch_size or settings.PURGE_BATCH_SIZE
+        self.max_lock = max_lock or settings.PURGE_MAX_LOCK_SECONDS
+        self.progress = progress
+
+    def report(self, label, done):
+        if self.progress is not None:
+            self.progress(label, done)
+
+    def drain(self, queryset, label, action=None):
+        size = self.batch_size
+        done = 0
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                ids = list(
+                    queryset.order_by('pk').values_list('pk', flat=True)[:size]
+                )
+                if not ids:
+                    break
+                batch = queryset.model.objects.filter(pk__in=ids)
+                if action is None:
+                    batch.delete()
+                    files = []
+                else:
+                    files = action(batch)
+            for name in files:
+                self.delete_file(name)
+            done += len(ids)
+            self.report(label, done)
+            elapsed = time.monotonic() - started
+            if elapsed > self.max_lock:
+                size = max(1, size // 2)
+            elif elapsed < self.max_lock / 4:
+                size = min(self.batch_size, size * 2)
+        return done
+
+    def delete_posts(self, batch):
+        files = [
+            name for name in batch.values_list('image', flat=True) if name
+        ]
+        batch.delete()
+        return files
+
+    def delete_file(self, name):
+        if not (
+            Post.objects.filter(image=name).exists()
+            or ArchivedPost.objects.filter(image=name).exists()
+        ):
+            Post._meta.get_field('image').storage.delete_blob(name)
+
+    def detach_posts(self, batch):
+        batch.update(group=None)
+        return []
+
+    def purge_user(self, user):
+        self.drain(Like.objects.filter(user=user), 'likes', remove_likes)
+        self.drain(Comment.objects.filter(author=user), 'comments')
+        self.drain(Comment.objects.filter(post__author=user), 'post comments')
+        self.drain(Follow.objects.filter(user=user), 'subscriptions')
+        self.drain(Follow.objects.filter(author=user), 'followers')
+        self.drain(
+            Post.objects.filter(author=user), 'posts', self.delete_posts
+        )
+        self.drain(ArchivedComment.objects.filter(author=user), 'archived comments')
+        self.drain(
+            ArchivedComment.objects.filter(post__author=user),
+            'archived post comments',
+        )
+        self.drain(
+            ArchivedPost.objects.filter(author=user),
+            'archived posts',
+            self.delete_posts,
+        )
+        user.delete()
+        self.invalidate()
+
+    def purge_group(self, group):
+        self.drain(group.posts.all(), 'posts', self.detach_posts)
+        group.delete()
+        self.invalidate()
+
+    def invalidate(self):
+        cache.clear()
@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period]
+
+
+def client_buckets(request, capacity):
+    """Корзины клиента: своя у пользователя и общая у его IP.
+
+    За одним IP (NAT, офис) бывает несколько человек, поэтому корзина IP в
+    RATELIMIT_IP_MULTIPLIER раз больше пользовательской.
+    """
+    ip = request.META.get(settings.RATELIMIT_IP_HEADER, '')
+    buckets = [(f'ip:{ip}', capacity * settings.RATELIMIT_IP_MULTIPLIER)]
+    if request.user.is_authenticated:
+        buckets.insert(0, (f'user:{request.user.pk}', capacity))
+    return buckets
+
+
+def hit(name, ident, capacity, period):
+    """Берет жетон из корзины на текущее окно; возвращает (можно ли, ждать).
+
+    Корзина наполняется до capacity в начале каждого окна длиной period.
+    В установившемся режиме это один атомарный cache.incr, первый запрос
+    окна делает cache.add. БД не трогается.
+    """
+    now = time.time()
+    window = int(now // period)
+    key = f'ratelimit:{name}:{ident}:{window}'
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, period + 1):
+            used = 1
+        else:
+            used = cache.incr(key)
+    return used <= capacity, int((window + 1) * period - now) + 1
+
+
+def ratelimit(name, methods=None):
+    """Ограничивает вызовы представления по правилу settings.RATELIMITS[name]."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATELIMITS.get(name)
+            if rate is None or (methods and request.method not in methods):
+                return view(request, *args, **kwargs)
+            capacity, period = parse_rate(rate)
+            allowed, retry_after = True, 0
+            for ident, bucket_capacity in client_buckets(request, capacity):
+                ok, wait = hit(name, ident, bucket_capacity, period)
+                if not ok:
+                    allowed, retry_after = False, max(retry_after, wait)
+                    logger.info('Лимит %s превышен для %s', name, ident)
+            with _stats_lock:
+                stats[f'{name}:{"allowed" if allowed else "limited"}'] += 1
+            if not allowed:
+                response = HttpResponse('Слишком много запросов', status=429)
+                response['Retry-After'] = retry_after
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .autocomplete import sources
+from .models import Comment, Group, GroupStats, Post, User
+from . import groupstats, live, prerender, tags
+from .loader import forget_groups
+from .paginator import adjust_count
+
+
+def count_scopes(author_id, group_id):
+    scopes = ['index', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    forget_groups()
+
+
+@receiver(post_save, sender=Group)
+def group_indexed(sender, instance, **kwargs):
+    sources['groups'].update(
+        instance.pk, (instance.pk, instance.title, {
+            'title': instance.title, 'slug': instance.slug,
+        })
+    )
+
+
+@receiver(post_delete, sender=Group)
+def group_unindexed(sender, instance, **kwargs):
+    sources['groups'].update(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_indexed(sender, instance, **kwargs):
+    if instance.is_active:
+        row = (instance.pk, instance.username, instance.username)
+        sources['users'].update(instance.pk, row)
+    else:
+        sources['users'].update(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_unindexed(sender, instance, **kwargs):
+    sources['users'].update(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.group_id
+    # Без обращения к атрибуту: отложенное поле вызвало бы запрос.
+    instance._loaded_text = instance.__dict__.get('text')
+
+
+@receiver(post_save, sender=Post)
+def post_tagged(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        tags.sync(instance, old_text='')
+    elif instance._loaded_text != instance.text:
+        tags.sync(instance, old_text=instance._loaded_text)
+    instance._loaded_text = instance.text
+
+
+@receiver(post_save, sender=Post)
+def post_group_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_group_id = None if created else instance._loaded_group_id
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id is not None:
+        groupstats.post_removed(old_group_id, instance)
+    if instance.group_id is not None:
+        groupstats.post_added(instance.group_id, instance)
+
+
+@receiver(post_save, sender=Post)
+def post_counted(sender, instance, created, **kwargs):
+    if created:
+        adjust_count(count_scopes(instance.author_id, instance.group_id), 1)
+    elif instance._loaded_group_id != instance.group_id:
+        if instance._loaded_group_id is not None:
+            adjust_count([f'group:{instance._loaded_group_id}'], -1)
+        if instance.group_id is not None:
+            adjust_count([f'group:{instance.group_id}'], 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_group_unstats(sender, instance, **kwargs):
+    if instance._loaded_group_id is not None:
+        groupstats.post_removed(instance._loaded_group_id, instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_uncounted(sender, instance, **kwargs):
+    adjust_count(count_scopes(instance.author_id, instance._loaded_group_id), -1)
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and settings.LIVE_SOCKET:
+        group = instance.group.slug if instance.group_id is not None else None
+        event = live.event_for(instance.id, instance.author_id, group)
+        transaction.on_commit(lambda: live.publish(event))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    if prerender.enabled():
+        prerender.mark_dirty(
+            prerender.post_scopes(instance, instance._loaded_group_id)
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    if prerender.enabled():
+        prerender.mark_dirty(prerender.post_scopes(instance.post))
+
+
+@receiver(post_save, sender=Post)
+def remember_saved_group(sender, instance, **kwargs):
+    # Последний обработчик: остальные сравнивают старую группу с новой.
+    instance._loaded_group_id = instance.group_id
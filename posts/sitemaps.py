@@ -0,0 +1,170 @@
+import datetime as dt
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ArchivedPost, Group, Post, User, Watermark
+
+SECTIONS = ('posts', 'authors', 'groups')
+
+
+def chunk_of(pk):
+    return (pk - 1) // settings.SITEMAP_CHUNK
+
+
+def chunk_range(chunk):
+    return chunk * settings.SITEMAP_CHUNK + 1, (chunk + 1) * settings.SITEMAP_CHUNK
+
+
+def section_urls(section, chunk):
+    """Отдает (путь, дата изменения) для объектов с id из данного куска."""
+    low, high = chunk_range(chunk)
+    if section == 'posts':
+        # Архивные посты открываются по тем же адресам, что и живые.
+        fields = ('id', 'author__username', 'pub_date')
+        live, archived = (
+            model.objects.filter(id__range=(low, high)).order_by().values_list(*fields)
+            for model in (Post, ArchivedPost)
+        )
+        for post_id, username, pub_date in live.union(archived).order_by('id').iterator():
+            yield reverse('post', args=[username, post_id]), pub_date
+    elif section == 'authors':
+        rows = User.objects.filter(id__range=(low, high), posts__isnull=False)
+        for username, last in rows.values_list('username').annotate(
+            last=Max('posts__pub_date')
+        ).order_by('id').iterator():
+            yield reverse('profile', args=[username]), last
+    else:
+        rows = Group.objects.filter(id__range=(low, high), posts__isnull=False)
+        for slug, last in rows.values_list('slug').annotate(
+            last=Max('posts__pub_date')
+        ).order_by('id').iterator():
+            yield reverse('group', args=[slug]), last
+
+
+def write_atomic(name, lines):
+    os.makedirs(settings.SITEMAP_ROOT, exist_ok=True)
+    path = os.path.join(settings.SITEMAP_ROOT, name)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(path + '.tmp', path)
+
+
+def urlset(base, urls):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for path, lastmod in urls:
+        yield (
+            f'<url><loc>{escape(base + path)}</loc>'
+            f'<lastmod>{lastmod.date().isoformat()}</lastmod></url>\n'
+        )
+    yield '</urlset>\n'
+
+
+def sitemap_index(base):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for name in sorted(os.listdir(settings.SITEMAP_ROOT)):
+        if not name.startswith('sitemap-') or not name.endswith('.xml'):
+            continue
+        path = os.path.join(settings.SITEMAP_ROOT, name)
+        lastmod = dt.datetime.utcfromtimestamp(os.path.getmtime(path))
+        yield (
+            f'<sitemap><loc>{escape(base)}/{name}</loc>'
+            f'<lastmod>{lastmod.date().isoformat()}</lastmod></sitemap>\n'
+        )
+    yield '</sitemapindex>\n'
+
+
+def changed_chunks(since):
+    """Куски, в которых с момента since появились или изменились посты."""
+    if since is None:
+        posts = Post.objects.all()
+    else:
+        posts = Post.objects.filter(pub_date__gt=since)
+    chunks = {section: set() for section in SECTIONS}
+    for post_id, author_id, group_id in posts.order_by().values_list(
+        'id', 'author_id', 'group_id'
+    ).iterator():
+        chunks['posts'].add(chunk_of(post_id))
+        chunks['authors'].add(chunk_of(author_id))
+        if group_id is not None:
+            chunks['groups'].add(chunk_of(group_id))
+    return chunks
+
+
+def count_by_chunk(queryset, field):
+    chunk = ExpressionWrapper(
+        (F(field) - 1) / settings.SITEMAP_CHUNK, output_field=IntegerField()
+    )
+    rows = queryset.filter(**{f'{field}__isnull': False}).annotate(
+        chunk=chunk
+    ).order_by().values('chunk').annotate(n=Count(field, distinct=True))
+    return {row['chunk']: row['n'] for row in rows}
+
+
+def chunk_sizes(section):
+    """Сколько адресов сейчас должно быть в каждом куске раздела."""
+    if section == 'posts':
+        sizes = count_by_chunk(Post.objects.all(), 'id')
+        for chunk, n in count_by_chunk(ArchivedPost.objects.all(), 'id').items():
+            sizes[chunk] = sizes.get(chunk, 0) + n
+        return sizes
+    if section == 'authors':
+        return count_by_chunk(Post.objects.all(), 'author_id')
+    return count_by_chunk(Post.objects.all(), 'group_id')
+
+
+def build(full=False):
+    """Перестраивает файлы sitemap-<раздел>-<кусок>.xml, затронутые с прошлой сборки.
+
+    В каждом файле не больше SITEMAP_CHUNK адресов: кусок — это диапазон id.
+    Новые посты находятся по дате публикации, удаления — по тому, что число
+    адресов в куске разошлось с записанным в прошлый раз (оно хранится в
+    Watermark sitemaps:<раздел>:<кусок>). Опустевший кусок удаляется.
+    Возвращает число переписанных и удаленных файлов.
+    """
+    mark = Watermark.get('sitemaps')
+    started = timezone.now()
+    since = None
+    if mark.position and not full:
+        since = dt.datetime.fromtimestamp(mark.position / 1e6)
+    base = f'{settings.SITEMAP_PROTOCOL}://{Site.objects.get_current().domain}'
+    written = 0
+    for section, chunks in changed_chunks(since).items():
+        sizes = chunk_sizes(section)
+        prefix = f'sitemaps:{section}:'
+        known = {
+            int(row.name[len(prefix):]): row.position
+            for row in Watermark.objects.filter(name__startswith=prefix)
+        }
+        chunks |= {
+            chunk for chunk in set(sizes) | set(known)
+            if full or known.get(chunk) != sizes.get(chunk, 0)
+        }
+        for chunk in sorted(chunks):
+            name = f'sitemap-{section}-{chunk}.xml'
+            if not sizes.get(chunk):
+                try:
+                    os.remove(os.path.join(settings.SITEMAP_ROOT, name))
+                except FileNotFoundError:
+                    pass
+                Watermark.objects.filter(name=f'{prefix}{chunk}').delete()
+            else:
+                write_atomic(name, urlset(base, section_urls(section, chunk)))
+                Watermark.objects.update_or_create(
+                    name=f'{prefix}{chunk}', defaults={'position': sizes[chunk]}
+                )
+            written += 1
+    if written or not os.path.exists(
+        os.path.join(settings.SITEMAP_ROOT, 'sitemap.xml')
+    ):
+        write_atomic('sitemap.xml', sitemap_index(base))
+    mark.position = int(started.timestamp() * 1e6)
+    mark.save()
+    return written
@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл один раз под sha256 его содержимого.
+
+    Повторная загрузка того же файла возвращает имя уже сохраненного блоба,
+    поэтому и миниатюры sorl строятся один раз на уникальную картинку.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        name = self.digest_name(name, digest.hexdigest())
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def digest_name(self, name, digest):
+        dirname, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(dirname, digest[:2], digest + ext)
+
+    def walk(self, path):
+        dirs, files = self.listdir(path)
+        for filename in files:
+            yield os.path.join(path, filename)
+        for dirname in dirs:
+            yield from self.walk(os.path.join(path, dirname))
+
+    def delete_blob(self, name):
+        delete(ImageFile(name, self))
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Follow, FollowSuggestion
+
+# Граф, доступный процессам-воркерам после fork.
+_graph = None
+
+
+class FollowGraph:
+    """Граф подписок в виде CSR: соседи вершины i — indices[indptr[i]:indptr[i + 1]]."""
+
+    def __init__(self, edges):
+        self.ids, dense = np.unique(edges, return_inverse=True)
+        dense = dense.reshape(edges.shape)
+        order = np.lexsort((dense[:, 1], dense[:, 0]))
+        sources, self.indices = dense[order, 0], dense[order, 1]
+        counts = np.bincount(sources, minlength=len(self.ids))
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+
+    @classmethod
+    def load(cls):
+        rows = Follow.objects.values_list('user_id', 'author_id').iterator()
+        flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+        return cls(flat.reshape(-1, 2))
+
+    def sources(self):
+        return np.flatnonzero(np.diff(self.indptr))
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def suggest(self, node, limit):
+        following = self.neighbors(node)
+        candidates = np.concatenate(
+            [self.neighbors(other) for other in following]
+        )
+        candidates = candidates[~np.isin(candidates, following)]
+        candidates = candidates[candidates != node]
+        if not len(candidates):
+            return []
+        nodes, counts = np.unique(candidates, return_counts=True)
+        top = np.lexsort((nodes, -counts))[:limit]
+        return [(int(self.ids[nodes[i]]), int(counts[i])) for i in top]
+
+
+def _init_worker(graph):
+    global _graph
+    _graph = graph
+
+
+def _suggest_chunk(args):
+    nodes, limit = args
+    return [
+        (int(_graph.ids[node]), _graph.suggest(node, limit)) for node in nodes
+    ]
+
+
+def compute(graph, limit, workers=None):
+    workers = workers or settings.SUGGESTIONS_WORKERS or os.cpu_count()
+    chunks = [
+        (chunk, limit)
+        for chunk in np.array_split(graph.sources(), workers * 4) if len(chunk)
+    ]
+    if workers == 1:
+        _init_worker(graph)
+        yield from map(_suggest_chunk, chunks)
+        return
+    context = multiprocessing.get_context('fork')
+    with context.Pool(workers, _init_worker, (graph,)) as pool:
+        yield from pool.imap_unordered(_suggest_chunk, chunks)
+
+
+def store(results):
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(
+            user_id__in=[user_id for user_id, _ in results]
+        ).delete()
+        FollowSuggestion.objects.bulk_create(
+            FollowSuggestion(
+                user_id=user_id, suggested_id=suggested_id, score=score, rank=rank
+            )
+            for user_id, suggestions in results
+            for rank, (suggested_id, score) in enumerate(suggestions)
+        )
+
+
+def rebuild(limit=None, workers=None):
+    limit = limit or settings.SUGGESTIONS_LIMIT
+    graph = FollowGraph.load()
+    users = 0
+    for results in compute(graph, limit, workers):
+        store(results)
+        users += len(results)
+    # Кто больше ни на кого не подписан, в граф не попал: его старые
+    # рекомендации иначе так и остались бы в таблице.
+    FollowSuggestion.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')
+    ).delete()
+    return users
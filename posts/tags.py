@@ -0,0 +1,150 @@
+import re
+
+from django.db import transaction
+
+from .models import Mention, Post, PostTag, Tag, User
+
+TOKEN = re.compile(r'(?<![\w#@])([#@])(\w[\w.+@-]*)')
+TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def tokens(text):
+    """(символ, имя, начало, конец) для каждого #тега и @упоминания."""
+    for match in TOKEN.finditer(text or ''):
+        sign, name = match.groups()
+        if sign == '#':
+            name = re.match(r'\w+', name).group()
+            if name.isdigit():
+                # «#5» — номер, а не тег.
+                continue
+        else:
+            name = name.rstrip('.+-@')
+        yield sign, name, match.start(), match.start() + 1 + len(name)
+
+
+def parse(text):
+    tags, mentions = set(), set()
+    for sign, name, _, _ in tokens(text):
+        if sign == '#' and len(name) <= TAG_LENGTH:
+            tags.add(name.lower())
+        elif sign == '@':
+            mentions.add(name)
+    return tags, mentions
+
+
+def link_targets(texts):
+    """Какие (#, тег) и (@, имя) из текстов ведут на существующие страницы."""
+    tags, mentions = set(), set()
+    for text in texts:
+        found_tags, found_mentions = parse(text)
+        tags |= found_tags
+        mentions |= found_mentions
+    targets = set()
+    if tags:
+        names = Tag.objects.filter(name__in=tags).values_list('name', flat=True)
+        targets.update(('#', name) for name in names)
+    if mentions:
+        names = User.objects.filter(username__in=mentions).values_list(
+            'username', flat=True
+        )
+        targets.update(('@', name) for name in names)
+    return targets
+
+
+def attach_links(posts):
+    """Проверяет ссылки всей страницы постов разом, для фильтра linkify."""
+    posts = list(posts)
+    targets = link_targets(post.text for post in posts)
+    for post in posts:
+        post.link_targets = targets
+    return posts
+
+
+def tag_ids(names):
+    if not names:
+        return {}
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in names], ignore_conflicts=True
+    )
+    return dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+def user_ids(usernames):
+    if not usernames:
+        return {}
+    return dict(
+        User.objects.filter(username__in=usernames).values_list('username', 'id')
+    )
+
+
+def stored(post):
+    tags = set(post.post_tags.values_list('tag__name', flat=True))
+    mentions = set(post.mentions.values_list('user__username', flat=True))
+    return tags, mentions
+
+
+@transaction.atomic
+def sync(post, old_text=None):
+    """Приводит теги и упоминания поста к его тексту.
+
+    Меняются только различия между старым и новым текстом; без старого
+    текста различия считаются от уже сохраненных связей.
+    """
+    old_tags, old_mentions = parse(old_text) if old_text is not None else stored(post)
+    tags, mentions = parse(post.text)
+    mentions.discard(post.author.username)
+
+    gone = old_tags - tags
+    if gone:
+        PostTag.objects.filter(post=post, tag__name__in=gone).delete()
+    PostTag.objects.bulk_create(
+        [PostTag(post=post, tag_id=tag_id)
+         for tag_id in tag_ids(tags - old_tags).values()],
+        ignore_conflicts=True,
+    )
+
+    gone = old_mentions - mentions
+    if gone:
+        Mention.objects.filter(post=post, user__username__in=gone).delete()
+    Mention.objects.bulk_create(
+        [Mention(post=post, user_id=user_id)
+         for user_id in user_ids(mentions - old_mentions).values()],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def reindex(posts):
+    """Заново размечает пачку постов: для бэкфилла и после импорта."""
+    parsed = {post.id: (post.author_id, parse(post.text)) for post in posts}
+    PostTag.objects.filter(post_id__in=parsed).delete()
+    Mention.objects.filter(post_id__in=parsed).delete()
+    names = set().union(*(tags for _, (tags, _) in parsed.values()))
+    usernames = set().union(*(mentions for _, (_, mentions) in parsed.values()))
+    tags_by_name = tag_ids(names)
+    users_by_name = user_ids(usernames)
+    PostTag.objects.bulk_create(
+        PostTag(post_id=post_id, tag_id=tags_by_name[name])
+        for post_id, (_, (tags, _)) in parsed.items()
+        for name in tags
+    )
+    Mention.objects.bulk_create(
+        Mention(post_id=post_id, user_id=users_by_name[name])
+        for post_id, (author_id, (_, mentions)) in parsed.items()
+        for name in mentions
+        if name in users_by_name and users_by_name[name] != author_id
+    )
+
+
+def backfill(batch_size):
+    last = 0
+    done = 0
+    while True:
+        posts = list(
+            Post.objects.filter(id__gt=last).order_by('id')[:batch_size]
+        )
+        if not posts:
+            return done
+        reindex(posts)
+        last = posts[-1].id
+        done += len(posts)
@@ -0,0 +1,17 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/live.html')
+def live_updates(scope, page):
+    """Плашка «N новых записей» для первой страницы ленты."""
+    newest = max((post.id for post in page), default=0)
+    return {
+        'show': page.number == 1,
+        'scope': scope,
+        'after': newest,
+        'live_url': settings.LIVE_URL,
+        'poll_ms': settings.LIVE_FALLBACK_POLL_MS,
+    }
@@ -0,0 +1,12 @@
+from django import template
+
+from ..paginator import elided_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page, on_each_side=2, on_ends=1):
+    return elided_range(
+        page.number, page.paginator.num_pages, on_each_side, on_ends
+    )
@@ -0,0 +1,43 @@
+import logging
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+
+def variants(image, geometries, **options):
+    return [
+        (get_thumbnail(image, geometry, crop='center', upscale=True, **options), width)
+        for geometry, width in geometries
+    ]
+
+
+def srcset(thumbnails):
+    return ', '.join(f'{im.url} {width}w' for im, width in thumbnails)
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(image, position=1):
+    width, height = settings.POST_IMAGE_SIZE
+    geometries = [
+        (f'{w}x{round(w * height / width)}', w)
+        for w in settings.POST_IMAGE_WIDTHS
+    ]
+    try:
+        jpeg = variants(image, geometries)
+        webp = variants(image, geometries, format='WEBP')
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', image)
+        return {}
+    return {
+        'fallback': jpeg[-1][0],
+        'width': geometries[-1][1],
+        'height': round(geometries[-1][1] * height / width),
+        'jpeg_srcset': srcset(jpeg),
+        'webp_srcset': srcset(webp),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'lazy': int(position) > settings.POST_IMAGE_EAGER,
+    }
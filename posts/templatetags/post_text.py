@@ -0,0 +1,33 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..tags import link_targets, tokens
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def linkify(text, post=None, autoescape=True):
+    """Превращает #теги и @упоминания в ссылки, остальное экранирует.
+
+    Ссылкой становятся только существующие теги и пользователи: их
+    заранее проверяет для страницы tags.attach_links, а для поста вне
+    страницы они ищутся здесь.
+    """
+    escape = conditional_escape if autoescape else (lambda value: value)
+    targets = getattr(post, 'link_targets', None)
+    if targets is None:
+        targets = link_targets([text])
+    parts = []
+    last = 0
+    for sign, name, start, end in tokens(text):
+        if (sign, name.lower() if sign == '#' else name) not in targets:
+            continue
+        url = reverse('tag' if sign == '#' else 'profile', args=[name])
+        parts.append(escape(text[last:start]))
+        parts.append(format_html('<a href="{}">{}{}</a>', url, sign, name))
+        last = end
+    parts.append(escape(text[last:]))
+    return mark_safe(''.join(parts))
@@ -1,11 +1,44 @@
+import asyncio
+import datetime as dt
+import gzip
+import json
 import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
+from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import OperationalError
+from django.template import engines
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from .models import Comment, Follow, Group, Post, User
+from . import groupstats, live, sitemaps, tags
+from .analytics import rollup
+from .archive import archive
+from .autocomplete import PrefixIndex, sources
+from .counters import view_counter
+from .likes import attach_likes, toggle_like
+from .loader import Loader, cached_group
+from .middleware import LoadShedder, load_shedder
+from .models import (
+    ArchivedPost, Comment, DailyGroupStats, DailyStats, Follow, FollowSuggestion,
+    Group, GroupStats, Like, Mention, PostTag, LikeCounter, Notification, Post, PostScore,
+    User, Watermark
+)
+from .notifications import fan_out
+from .paginator import elided_range, posts_paginator
+from .prerender import page_file, publish
+from .purge import Purger
+from .ratelimit import parse_rate
+from .suggestions import rebuild
+from .trending import trending_posts, update_scores
+from .warmup import template_names, warm_up, warm_views
 
 
 class ProfileTest(TestCase):
@@ -120,7 +153,7 @@ class ProfileTest(TestCase):
             author=self.user_is_login,
             group=self.group
             )
-        response = self.client.get(reverse('index'))
+        response = self.client_test.get(reverse('index'))
         self.assertContains(response, post_one.text)
         post = response.context.get('post')
         self.assertEqual(post.text, post_one.text)
@@ -132,10 +165,10 @@ class ProfileTest(TestCase):
             author=self.user_is_login,
             group=self.group
             )
-        response = self.client.get(reverse('index'))
+        response = self.client_test.get(reverse('index'))
         self.assertNotContains(response, post_two.text)
         cache.clear()
-        response = self.client.get(reverse('index'))
+        response = self.client_test.get(reverse('index'))
         self.assertContains(response, post_two.text)
 
     def test_follow(self):
@@ -278,6 +311,23 @@ class ImageTest(TestCase):
                 self.assertEqual(response.status_code, 200)
                 self.assertContains(response, '<img')
 
+    def test_image_variants(self):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+            )
+        for i in range(3):
+            Post.objects.create(
+                text=f'post {i}',
+                author=self.user_is_login,
+                image=SimpleUploadedFile('small.gif', small_gif, content_type='gif')
+            )
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"', count=3)
+        self.assertContains(response, ' 480w', count=6)
+        self.assertContains(response, 'loading="lazy"', count=1)
+
     def test_not_img(self):
         test_file = SimpleUploadedFile(
             name='test_file.txt',
@@ -308,3 +358,1209 @@ class ImageTest(TestCase):
             os.remove('media/posts/test_file.txt')
         except:
             print('file already deleted')
+
+
+class PurgeTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(
+            title='test group',
+            slug='test',
+            description='testing'
+        )
+        for i in range(7):
+            post = Post.objects.create(
+                text=f'post {i}',
+                author=self.author,
+                group=self.group
+            )
+            Comment.objects.create(post=post, author=self.reader, text='hi')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_purge_user(self):
+        call_command('purge_user', 'author', batch_size=3, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertEqual(Follow.objects.count(), 0)
+
+    def test_purge_user_drains_archive(self):
+        old = dt.datetime.now() - dt.timedelta(days=400)
+        Post.objects.filter(text__in=['post 0', 'post 1']).update(pub_date=old)
+        archive()
+        ArchivedPost.objects.filter(text='post 0').update(image='posts/old.gif')
+        labels = []
+        purger = Purger(batch_size=3, progress=lambda label, done: labels.append(label))
+        with mock.patch.object(Purger, 'delete_file') as delete_file:
+            purger.purge_user(self.author)
+        delete_file.assert_called_once_with('posts/old.gif')
+        self.assertIn('archived posts', labels)
+        self.assertIn('archived post comments', labels)
+        self.assertFalse(ArchivedPost.objects.exists())
+
+    def test_purge_group(self):
+        call_command('purge_group', 'test', batch_size=2, stdout=StringIO())
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(Post.objects.filter(group__isnull=True).count(), 7)
+
+
+class ImageStorageTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+        b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+        b'\x02\x4c\x01\x00\x3b'
+    )
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.user = User.objects.create(username='dummy')
+
+    def create_post(self, filename):
+        return Post.objects.create(
+            text='meme',
+            author=self.user,
+            image=SimpleUploadedFile(filename, self.small_gif, content_type='gif')
+        )
+
+    def test_same_upload_is_stored_once(self):
+        first = self.create_post('small.gif')
+        second = self.create_post('copy.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(Post.image_references(), {first.image.name: 2})
+        storage = first.image.storage
+        self.assertEqual(len(list(storage.walk('posts'))), 1)
+
+    def test_gc_removes_orphans(self):
+        post = self.create_post('small.gif')
+        storage = post.image.storage
+        name = post.image.name
+        call_command('gc_images', grace=0, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+        post.delete()
+        call_command('gc_images', grace=0, stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+
+class MediaServeTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.digest = 'ab' * 32
+        with open(os.path.join(self.media, f'{self.digest}.txt'), 'wb') as f:
+            f.write(b'0123456789')
+        self.url = f'/media/{self.digest}.txt'
+
+    def test_full_and_conditional(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, 416)
+        empty = f'{"cd" * 32}.txt'
+        open(os.path.join(self.media, empty), 'wb').close()
+        response = self.client.get(f'/media/{empty}', HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 416)
+
+    def test_offload(self):
+        with override_settings(MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected-media/{self.digest}.txt'
+        )
+
+    def test_missing(self):
+        self.assertEqual(self.client.get('/media/nope.txt').status_code, 404)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+
+class WarmupTest(TestCase):
+    def test_warmup_command(self):
+        user = User.objects.create(username='dummy')
+        post = Post.objects.create(text='warm', author=user)
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        self.assertIn(reverse('post', args=['dummy', post.id]), out.getvalue())
+        self.assertIn('index.html', template_names(engines['django'].engine))
+
+    def test_warmup_does_not_count_views(self):
+        user = User.objects.create(username='dummy')
+        post = Post.objects.create(text='warm', author=user)
+        view_counter.flush()
+        warm_views()
+        view_counter.flush()
+        post.refresh_from_db()
+        self.assertEqual(post.views, 0)
+
+    def test_failed_stage_does_not_break_warmup(self):
+        with mock.patch('posts.warmup.template_names', side_effect=OSError('gone')):
+            templates, patterns, urls = warm_up()
+        self.assertEqual(templates, 0)
+        self.assertGreater(patterns, 0)
+
+
+class NotificationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create(username='reader')
+        self.author = User.objects.create(username='author')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def unread(self):
+        return self.client.get(reverse('notifications_count')).json()['unread']
+
+    def test_posts_are_coalesced_into_digest(self):
+        for i in range(3):
+            Post.objects.create(text=f'post {i}', author=self.author)
+        self.assertEqual(self.unread(), 0)
+        fan_out(batch_size=2)
+        fan_out(batch_size=2)
+        self.assertEqual(fan_out(), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(self.unread(), 3)
+
+    def test_reading_resets_counter(self):
+        Post.objects.create(text='post', author=self.author)
+        fan_out()
+        response = self.client.get(reverse('notifications'))
+        self.assertContains(response, '@author')
+        self.assertEqual(self.unread(), 0)
+        Post.objects.create(text='post', author=self.author)
+        fan_out()
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def tearDown(self):
+        cache.clear()
+
+
+@override_settings(VIEW_COUNTER_MAX_PENDING=3, VIEW_COUNTER_INTERVAL=3600)
+class ViewCounterTest(TestCase):
+    def setUp(self):
+        view_counter.flush()
+        self.user = User.objects.create(username='dummy')
+        self.post = Post.objects.create(text='post', author=self.user)
+        self.other = Post.objects.create(text='other', author=self.user)
+
+    def visit(self, post):
+        self.client.get(reverse('post', args=[self.user.username, post.id]))
+
+    def test_views_are_flushed_in_batch(self):
+        self.visit(self.post)
+        self.visit(self.other)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        with self.assertNumQueries(1):
+            view_counter.hit(self.post.id)
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.post.views, self.other.views), (2, 1))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Просмотров: 2')
+
+    def test_failed_flush_keeps_page_and_views(self):
+        locked = OperationalError('database is locked')
+        with mock.patch('posts.counters.Post.objects.filter', side_effect=locked):
+            for _ in range(3):
+                response = self.client.get(
+                    reverse('post', args=[self.user.username, self.post.id])
+                )
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(view_counter.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+
+    def test_saving_stale_post_keeps_flushed_views(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        view_counter.hit(self.post.id)
+        view_counter.hit(self.post.id)
+        view_counter.flush()
+        stale.text = 'edited'
+        stale.save()
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('post_edit', args=[self.user.username, self.post.id]),
+            {'text': 'edited again'},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.text, self.post.views), ('edited again', 2))
+
+
+@override_settings(LIKE_COUNTER_SHARDS=4)
+class LikeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.posts = [
+            Post.objects.create(text=f'post {i}', author=self.author)
+            for i in range(10)
+        ]
+        self.readers = [User.objects.create(username=f'reader{i}') for i in range(5)]
+
+    def test_toggle_and_count(self):
+        post = self.posts[0]
+        for reader in self.readers:
+            self.assertTrue(toggle_like(reader, post))
+        self.assertFalse(toggle_like(self.readers[0], post))
+        self.assertEqual(Like.objects.filter(post=post).count(), 4)
+        self.assertLessEqual(LikeCounter.objects.filter(post=post).count(), 4)
+        attach_likes([post], self.readers[1])
+        self.assertEqual(post.likes_total, 4)
+        self.assertTrue(post.liked)
+
+    def test_feed_like_state_in_constant_queries(self):
+        reader = self.readers[0]
+        toggle_like(reader, self.posts[3])
+        with self.assertNumQueries(2):
+            attach_likes(self.posts, reader)
+        self.assertEqual([p.liked for p in self.posts].count(True), 1)
+
+    def test_like_view(self):
+        post = self.posts[0]
+        self.client.force_login(self.readers[0])
+        response = self.client.post(
+            reverse('post_like', args=['author', post.id]), {'next': '/'}
+        )
+        self.assertRedirects(response, '/')
+        self.assertTrue(Like.objects.filter(post=post).exists())
+        response = self.client.get(reverse('post', args=['author', post.id]))
+        self.assertContains(response, '&hearts; 1')
+
+    def test_index_like_state_is_not_shared(self):
+        alice, bob = Client(), Client()
+        alice.force_login(self.readers[0])
+        bob.force_login(self.readers[1])
+        toggle_like(self.readers[0], self.posts[9])
+        self.assertContains(alice.get('/'), 'text-danger')
+        response = bob.get('/')
+        self.assertNotContains(response, 'text-danger')
+        self.assertEqual(response.context['user'], self.readers[1])
+
+    def test_index_is_cached_for_anonymous_only(self):
+        self.client.get('/')
+        Post.objects.create(text='fresh', author=self.author)
+        self.assertNotContains(self.client.get('/'), 'fresh')
+        self.client.force_login(self.readers[0])
+        self.assertContains(self.client.get('/'), 'fresh')
+
+    def test_concurrent_like_is_not_an_error(self):
+        post = self.posts[0]
+        toggle_like(self.readers[0], post)
+        # Второй запрос не увидел лайк при удалении: его вставил параллельный.
+        missed = mock.Mock(**{'delete.return_value': (0, {})})
+        with mock.patch('posts.likes.Like.objects.filter', return_value=missed):
+            self.assertTrue(toggle_like(self.readers[0], post))
+        attach_likes([post], self.readers[0])
+        self.assertEqual(post.likes_total, 1)
+
+    def test_purged_user_likes_are_uncounted(self):
+        for post in self.posts[:3]:
+            toggle_like(self.readers[0], post)
+            toggle_like(self.readers[1], post)
+        Purger(batch_size=2).purge_user(self.readers[0])
+        attach_likes(self.posts[:3], self.readers[1])
+        self.assertEqual([post.likes_total for post in self.posts[:3]], [1, 1, 1])
+
+    def tearDown(self):
+        cache.clear()
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(title='g', slug='g', description='g')
+        self.quiet = Post.objects.create(text='quiet', author=self.author)
+        self.hot = Post.objects.create(text='hot', author=self.author, group=self.group)
+
+    def test_scores_follow_activity(self):
+        update_scores()
+        Comment.objects.create(post=self.hot, author=self.reader, text='wow')
+        update_scores()
+        self.assertEqual(trending_posts(), [self.hot, self.quiet])
+        self.assertEqual(trending_posts(self.group), [self.hot])
+        for _ in range(3):
+            Comment.objects.create(post=self.quiet, author=self.reader, text='wow')
+        update_scores()
+        self.assertEqual(trending_posts()[0], self.quiet)
+
+    def test_old_scores_decay(self):
+        update_scores()
+        clock = Watermark.get('trending:clock')
+        clock.position -= 100 * settings.TRENDING_HALF_LIFE
+        clock.save()
+        update_scores()
+        self.assertEqual(PostScore.objects.count(), 0)
+
+    def test_trending_pages(self):
+        update_scores()
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(reverse('trending')), 'hot')
+        response = self.client.get(reverse('group_trending', args=['g']))
+        self.assertContains(response, 'hot')
+        self.assertNotContains(response, 'quiet')
+
+    def tearDown(self):
+        cache.clear()
+
+
+class FollowSuggestionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create(username=name) for name in 'abcde'
+        }
+        for user, author in ['ab', 'bc', 'bd', 'ae', 'ec', 'ca']:
+            Follow.objects.create(
+                user=self.users[user], author=self.users[author]
+            )
+
+    def suggested(self, name):
+        return [
+            (item.suggested.username, item.score)
+            for item in self.users[name].suggestions.select_related('suggested')
+        ]
+
+    def test_friends_of_friends(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                rebuild(limit=5, workers=workers)
+                self.assertEqual(self.suggested('a'), [('c', 2), ('d', 1)])
+                self.assertEqual(self.suggested('c'), [('b', 1), ('e', 1)])
+
+    def test_unfollowing_everyone_clears_suggestions(self):
+        rebuild(workers=1)
+        Follow.objects.filter(user=self.users['a']).delete()
+        rebuild(workers=1)
+        self.assertEqual(self.suggested('a'), [])
+        Follow.objects.all().delete()
+        self.assertEqual(rebuild(workers=1), 0)
+        self.assertFalse(FollowSuggestion.objects.exists())
+
+    def test_panel_skips_followed_authors(self):
+        rebuild(workers=1)
+        self.client.force_login(self.users['a'])
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(
+            [item.suggested.username for item in response.context['suggestions']],
+            ['c', 'd']
+        )
+        Follow.objects.create(user=self.users['a'], author=self.users['c'])
+        response = self.client.get(reverse('profile', args=['b']))
+        self.assertContains(response, '@d')
+        self.assertNotContains(response, '@c<')
+
+    def tearDown(self):
+        cache.clear()
+
+
+class DumpTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='Pass-1234')
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(title='g', slug='g', description='g')
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'пост {i}', author=self.author, group=self.group
+            )
+            Comment.objects.create(post=post, author=self.reader, text='hi')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_export_then_import_roundtrip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'dump.jsonl.gz')
+        call_command('export_jsonl', path, chunk_size=2)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2 + 1 + 5 + 5 + 1)
+        texts = sorted(Post.objects.values_list('text', flat=True))
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        call_command('import_jsonl', path, batch_size=3, stdout=StringIO())
+        self.assertEqual(sorted(Post.objects.values_list('text', flat=True)), texts)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertTrue(User.objects.get(username='author').check_password('Pass-1234'))
+        self.assertEqual(Watermark.get('notifications').position, Post.objects.latest('id').id)
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_profile_download(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('profile_export', args=['author']))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['fields']['text'], 'пост 0')
+        response = self.client.get(reverse('profile_export', args=['reader']))
+        self.assertEqual(response.status_code, 403)
+
+
+class SitemapFeedTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.settings = override_settings(SITEMAP_ROOT=self.root, SITEMAP_CHUNK=2)
+        self.settings.enable()
+        self.author = User.objects.create(username='author')
+        self.group = Group.objects.create(title='g', slug='g', description='g')
+        self.posts = [
+            Post.objects.create(text=f'post {i}', author=self.author, group=self.group)
+            for i in range(5)
+        ]
+
+    def test_incremental_build(self):
+        self.assertEqual(sitemaps.build(), 5)
+        files = sorted(os.listdir(self.root))
+        self.assertIn('sitemap-posts-2.xml', files)
+        self.assertEqual(sitemaps.build(), 0)
+        post = Post.objects.create(text='new', author=self.author)
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=post.pub_date + dt.timedelta(seconds=5)
+        )
+        self.assertEqual(sitemaps.build(), 2)
+        response = self.client.get('/sitemap.xml')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('sitemap-posts-2.xml', content)
+        response = self.client.get('/sitemap-posts-0.xml')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<url>'), 2)
+
+    def test_deleted_and_archived_posts(self):
+        sitemaps.build()
+        old = dt.datetime.now() - dt.timedelta(days=400)
+        Post.objects.filter(pk__in=[self.posts[0].pk, self.posts[1].pk]).update(pub_date=old)
+        archive()
+        self.assertEqual(sitemaps.build(), 0)
+        self.posts[2].delete()
+        self.posts[4].delete()
+        self.assertEqual(sitemaps.build(), 2)
+        self.assertNotIn('sitemap-posts-2.xml', os.listdir(self.root))
+        with open(os.path.join(self.root, 'sitemap-posts-0.xml')) as f:
+            self.assertEqual(f.read().count('<url>'), 2)
+        with open(os.path.join(self.root, 'sitemap-posts-1.xml')) as f:
+            content = f.read()
+        self.assertEqual(content.count('<url>'), 1)
+        self.assertIn(reverse('post', args=['author', self.posts[3].pk]), content)
+        self.assertEqual(sitemaps.build(full=True), 4)
+
+    def test_feeds_support_conditional_get(self):
+        for url in ('/author/feed/', '/group/g/feed/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'post 4')
+                self.assertIn('atom', response['Content-Type'])
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class PrerenderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.settings = override_settings(PRERENDER_ROOT=self.root, PRERENDER_PAGES=2)
+        self.settings.enable()
+        self.author = User.objects.create(username='author')
+        self.group = Group.objects.create(title='g', slug='g', description='g')
+        for i in range(25):
+            Post.objects.create(text=f'post {i}', author=self.author, group=self.group)
+
+    def test_publish_and_serve(self):
+        self.assertEqual(publish(everything=True), 3)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'group/g/page-2.html.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'page-3.html')))
+        Post.objects.filter(text='post 24').update(text='changed behind the cache')
+        response = self.client.get('/')
+        self.assertContains(response, 'post 24')
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get('/', {'page': 3})
+        self.assertEqual(response.status_code, 200)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get('/'), 'changed behind the cache')
+
+    def test_changes_mark_scopes_dirty(self):
+        publish(everything=True)
+        Post.objects.create(text='fresh', author=self.author)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'author/page-1.html')))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'group/g/page-1.html')))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, '.dirty'))), ['index', 'profile:author'])
+        self.assertEqual(publish(), 2)
+        self.assertContains(self.client.get('/author/'), 'fresh')
+
+    def test_moving_post_marks_old_group_dirty(self):
+        other = Group.objects.create(title='o', slug='o', description='o')
+        publish(everything=True)
+        post = Post.objects.get(text='post 0')
+        post.group = other
+        post.save()
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'group/g/page-1.html')))
+        self.assertIn('group:g', os.listdir(os.path.join(self.root, '.dirty')))
+
+    def test_page_file_stays_under_root(self):
+        root = os.path.realpath(self.root)
+        self.assertEqual(page_file('/a%2Fb/', 1), os.path.join(root, 'a%2Fb', 'page-1.html'))
+        for url in ('/../', '/%2e%2e/', '/group/../../etc/'):
+            with self.assertRaises(ValueError):
+                page_file(url, 1)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+        cache.clear()
+
+
+class PaginatorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'post {i}', author=self.author) for i in range(300)
+        )
+
+    def test_elided_range(self):
+        self.assertEqual(elided_range(1, 5), [1, 2, 3, 4, 5])
+        self.assertEqual(elided_range(1, 30), [1, 2, 3, None, 30])
+        self.assertEqual(elided_range(15, 30), [1, None, 13, 14, 15, 16, 17, None, 30])
+        self.assertEqual(elided_range(30, 30), [1, None, 28, 29, 30])
+
+    def test_count_is_cached_and_adjusted(self):
+        queryset = Post.objects.all()
+        self.assertEqual(posts_paginator(queryset, 'index').count, 300)
+        with self.assertNumQueries(0):
+            self.assertEqual(posts_paginator(queryset, 'index').count, 300)
+        post = Post.objects.create(text='one more', author=self.author)
+        self.assertEqual(posts_paginator(queryset, 'index').count, 301)
+        post.delete()
+        self.assertEqual(posts_paginator(queryset, 'index').count, 300)
+
+    def test_navigation_has_constant_size(self):
+        response = self.client.get(reverse('profile', args=['author']), {'page': 15})
+        self.assertContains(response, 'class="page-link" href="?page=', count=8)
+        self.assertContains(response, '&hellip;', count=2)
+
+    def tearDown(self):
+        cache.clear()
+
+
+class LoadSheddingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.saved_limit = load_shedder.limit
+        self.user = User.objects.create(username='dummy', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_aimd_limit(self):
+        shedder = LoadShedder()
+        start = shedder.limit
+        self.assertTrue(shedder.admit('index', 'normal'))
+        shedder.release('index', 10.0)
+        self.assertLess(shedder.limit, start)
+        for _ in range(100):
+            shedder.admit('index', 'normal')
+            shedder.release('index', 10.0)
+        self.assertEqual(shedder.limit, 2.0)
+        self.assertTrue(shedder.admit('follow_index', 'low'))
+        self.assertFalse(shedder.admit('follow_index', 'low'))
+        self.assertTrue(shedder.admit('index', 'normal'))
+        self.assertTrue(shedder.admit('post', 'protected'))
+        shedder.release('index', 0.01)
+        self.assertGreater(shedder.limit, 2.0)
+
+    def test_limit_recovers_without_responses(self):
+        shedder = LoadShedder()
+        shedder.limit = 2.0
+        shedder.inflight = 1
+        self.assertFalse(shedder.admit('follow_index', 'low'))
+        shedder.updated -= 10 * settings.SHED_RECOVER_AFTER
+        self.assertTrue(shedder.admit('follow_index', 'low'))
+        self.assertGreaterEqual(shedder.limit, 12.0)
+
+    def test_sync_workers_share_inflight_count(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        shedder = LoadShedder()
+        with override_settings(SHED_SHARED_DIR=directory):
+            for _ in range(100):
+                self.assertTrue(shedder.admit('follow_index', 'low'))
+                shedder.release('follow_index', 10.0)
+            self.assertEqual(shedder.limit, 2.0)
+            # Соседний воркер занят медленным запросом.
+            with open(os.path.join(directory, str(os.getppid())), 'w') as f:
+                f.write('1')
+            with open(os.path.join(directory, '999999999'), 'w') as f:
+                f.write('5')
+            self.assertFalse(shedder.admit('follow_index', 'low'))
+            self.assertTrue(shedder.admit('index', 'normal'))
+            with open(os.path.join(directory, str(os.getpid()))) as f:
+                self.assertEqual(f.read(), '1')
+            self.assertNotIn('999999999', os.listdir(directory))
+
+    def test_overload_sheds_low_priority_routes(self):
+        # Один запрос уже выполняется, лимит на минимуме.
+        load_shedder.limit = 2.0
+        load_shedder.inflight = 1
+        load_shedder.updated = time.monotonic()
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(self.client.get(reverse('index'), {'page': 50}).status_code, 503)
+        self.assertEqual(self.client.get(reverse('index')).status_code, 200)
+        state = self.client.get(reverse('load_status')).json()
+        self.assertEqual(state['routes']['follow_index']['rejected'], 1)
+        self.assertIn('index', state['routes'])
+
+    def tearDown(self):
+        load_shedder.limit = self.saved_limit
+        load_shedder.inflight = 0
+        cache.clear()
+
+
+@override_settings(RATELIMITS={'add_comment': '2/m', 'follow': '1/h'})
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='dummy', is_staff=True)
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(text='text', author=self.author)
+        self.client.force_login(self.user)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('100/d'), (100, 86400))
+
+    def test_comment_limit(self):
+        url = reverse('add_comment', args=[self.author.username, self.post.id])
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {'text': 'hi'}).status_code, 302)
+        response = self.client.post(url, {'text': 'hi'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Comment.objects.count(), 2)
+        # GET не расходует лимит.
+        self.assertNotEqual(self.client.get(url).status_code, 429)
+        state = self.client.get(reverse('load_status')).json()
+        self.assertGreaterEqual(state['ratelimit']['add_comment:limited'], 1)
+
+    def test_limit_is_per_user(self):
+        follow = reverse('profile_follow', args=[self.author.username])
+        self.assertEqual(self.client.get(follow).status_code, 302)
+        self.assertEqual(self.client.get(follow).status_code, 429)
+        other = User.objects.create(username='other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(follow).status_code, 302)
+
+    @override_settings(RATELIMIT_IP_MULTIPLIER=2)
+    def test_ip_bucket_applies_to_users(self):
+        follow = reverse('profile_follow', args=[self.author.username])
+        for name in ['first', 'second']:
+            self.client.force_login(User.objects.create(username=name))
+            self.assertEqual(self.client.get(follow).status_code, 302)
+        self.client.force_login(User.objects.create(username='third'))
+        self.assertEqual(self.client.get(follow).status_code, 429)
+        self.client.force_login(User.objects.create(username='fourth'))
+        other_ip = self.client.get(follow, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other_ip.status_code, 302)
+
+    def tearDown(self):
+        cache.clear()
+
+
+class LoaderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='dummy')
+        self.group = Group.objects.create(title='Group', slug='group')
+        self.posts = [
+            Post.objects.create(text=str(i), author=self.user, group=self.group)
+            for i in range(3)
+        ]
+
+    def test_posts_share_related_objects(self):
+        loader = Loader()
+        posts = list(Post.objects.all())
+        cached_group('group')
+        with self.assertNumQueries(1):
+            loader.attach(posts)
+        with self.assertNumQueries(0):
+            self.assertEqual({id(post.author) for post in posts}, {id(posts[0].author)})
+            self.assertEqual(posts[0].group.slug, 'group')
+            post = loader.post(self.posts[0].id, 'dummy')
+        self.assertIs(post.author, posts[0].author)
+
+    def test_post_username_is_checked(self):
+        User.objects.create(username='other')
+        response = self.client.get(reverse('post', args=['other', self.posts[0].id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_group_cache_invalidated(self):
+        self.assertEqual(cached_group('group').title, 'Group')
+        self.group.title = 'Renamed'
+        self.group.save()
+        self.assertEqual(cached_group('group').title, 'Renamed')
+        self.group.delete()
+        self.assertIsNone(cached_group('group'))
+
+    def test_group_from_other_process_is_found(self):
+        cached_group('group')
+        Group.objects.bulk_create([Group(title='New', slug='new')])
+        self.assertEqual(cached_group('new').title, 'New')
+        self.assertEqual(self.client.get(reverse('group', args=['new'])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('group', args=['none'])).status_code, 404)
+
+    def test_author_counts(self):
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        author = Loader().author('dummy')
+        self.assertEqual(author.following_count, 1)
+        self.assertEqual(author.follower_count, 0)
+        self.assertEqual(author.posts_count, 3)
+        response = self.client.get(reverse('profile', args=['dummy']))
+        self.assertContains(response, 'Записей: 3')
+
+    def tearDown(self):
+        cache.clear()
+
+
+class GroupStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first = User.objects.create(username='first')
+        self.second = User.objects.create(username='second')
+        self.group = Group.objects.create(title='Group', slug='group')
+        self.other = Group.objects.create(title='Other', slug='other')
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_posts(self):
+        self.assertEqual(self.stats(self.group).posts_count, 0)
+        old = Post.objects.create(text='1', author=self.first, group=self.group)
+        new = Post.objects.create(text='2', author=self.second, group=self.group)
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.last_post_at, new.pub_date)
+        self.assertEqual(stats.authors(), ['second', 'first'])
+
+        new.group = self.other
+        new.save()
+        self.assertEqual(self.stats(self.group).authors(), ['first'])
+        self.assertEqual(self.stats(self.group).last_post_at, old.pub_date)
+        self.assertEqual(self.stats(self.other).posts_count, 1)
+
+        old.delete()
+        stats = self.stats(self.group)
+        self.assertEqual((stats.posts_count, stats.last_post_at), (0, None))
+        self.assertEqual(stats.authors(), [])
+
+    def test_rebuild_matches_incremental(self):
+        for i in range(3):
+            Post.objects.create(text=str(i), author=self.first, group=self.other)
+        expected = list(GroupStats.objects.values())
+        GroupStats.objects.all().delete()
+        groupstats.rebuild()
+        self.assertEqual(list(GroupStats.objects.values()), expected)
+
+    def test_directory_queries(self):
+        Post.objects.create(text='1', author=self.first, group=self.group)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('group_index'))
+        self.assertContains(response, '@first')
+        self.assertContains(response, reverse('group', args=['other']))
+
+    def tearDown(self):
+        cache.clear()
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='dummy', is_staff=True)
+        self.other = User.objects.create(username='other')
+        self.group = Group.objects.create(title='Group', slug='group')
+
+    def test_rollup_is_incremental(self):
+        post = Post.objects.create(text='1', author=self.user, group=self.group)
+        Comment.objects.create(text='c', author=self.other, post=post)
+        self.assertEqual(rollup(batch_size=1), 2)
+        self.assertEqual(rollup(batch_size=1), 0)
+        Post.objects.create(text='2', author=self.user)
+        self.assertEqual(rollup(), 1)
+
+        today = DailyStats.objects.get()
+        self.assertEqual(
+            (today.posts, today.comments, today.active_authors), (2, 1, 2)
+        )
+        by_group = DailyGroupStats.objects.get()
+        self.assertEqual((by_group.posts, by_group.comments), (1, 1))
+
+    def test_dashboard(self):
+        Post.objects.create(text='1', author=self.user, group=self.group)
+        rollup()
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('analytics'))
+        self.assertContains(response, 'Записей: 1')
+        self.assertContains(response, reverse('group', args=['group']))
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('analytics')).status_code, 302)
+
+
+class TagTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='dummy')
+        self.friend = User.objects.create(username='friend.one')
+        self.client.force_login(self.friend)
+
+    def tags_of(self, post):
+        return set(post.post_tags.values_list('tag__name', flat=True))
+
+    def test_parse(self):
+        self.assertEqual(
+            tags.parse('#Django и #django, @friend.one. а&#39;b mail@x.ru'),
+            ({'django'}, {'friend.one'}),
+        )
+
+    def test_edit_updates_only_changes(self):
+        post = Post.objects.create(text='#one #two @friend.one', author=self.user)
+        self.assertEqual(self.tags_of(post), {'one', 'two'})
+        self.assertEqual(Mention.objects.get().user, self.friend)
+        kept = PostTag.objects.get(tag__name='one').id
+
+        post.text = '#one #three'
+        post.save()
+        self.assertEqual(self.tags_of(post), {'one', 'three'})
+        self.assertEqual(PostTag.objects.get(tag__name='one').id, kept)
+        self.assertFalse(Mention.objects.exists())
+
+    def test_tag_feed_keyset(self):
+        posts = [
+            Post.objects.create(text=f'{i} #news', author=self.user)
+            for i in range(15)
+        ]
+        response = self.client.get(reverse('tag', args=['News']))
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertContains(response, f'href="{reverse("tag", args=["news"])}"')
+        before = response.context['next_before']
+        response = self.client.get(reverse('tag', args=['news']), {'before': before})
+        self.assertEqual(
+            [post.id for post in response.context['posts']],
+            [post.id for post in reversed(posts[:5])],
+        )
+        self.assertIsNone(response.context['next_before'])
+
+    def test_only_existing_targets_are_linked(self):
+        Post.objects.create(
+            text='#news @friend.one @ghost <b>', author=self.user
+        )
+        Post.objects.create(text=f'#{"x" * 70}', author=self.user)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            tags.attach_links(posts)
+        self.assertEqual(posts[0].link_targets, {('#', 'news'), ('@', 'friend.one')})
+        response = self.client.get(reverse('profile', args=['dummy']))
+        self.assertContains(response, f'href="{reverse("tag", args=["news"])}"')
+        self.assertContains(response, f'href="{reverse("profile", args=["friend.one"])}"')
+        self.assertNotContains(response, 'href="/ghost/"')
+        self.assertContains(response, '@ghost &lt;b&gt;')
+        self.assertNotContains(response, 'href="/tag/xxx')
+
+    def test_mentions_inbox_and_backfill(self):
+        post = Post.objects.create(text='hi', author=self.user)
+        Post.objects.filter(pk=post.pk).update(text='hi @friend.one #old')
+        self.assertEqual(tags.backfill(batch_size=1), 1)
+        response = self.client.get(reverse('mentions'))
+        self.assertEqual(response.context['posts'], [post])
+        self.assertEqual(self.tags_of(post), {'old'})
+
+    def tearDown(self):
+        cache.clear()
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        for source in sources.values():
+            source.index = None
+        for name in ['anna', 'Andrew', 'bob', 'annette']:
+            User.objects.create(username=name)
+        Group.objects.create(title='Android', slug='android')
+
+    def test_prefix_index(self):
+        index = PrefixIndex([(1, 'b', 'b'), (2, 'ab', 'ab'), (3, 'aa', 'aa')])
+        self.assertEqual(index.search('a', 10), ['aa', 'ab'])
+        index.add(4, 'Aab', 'Aab')
+        index.add(3, 'c', 'c')
+        self.assertEqual(index.search('a', 10), ['Aab', 'ab'])
+        index.discard(2)
+        self.assertEqual(index.search('a', 1), ['Aab'])
+        self.assertEqual(len(index), 3)
+
+    def test_endpoint(self):
+        url = reverse('autocomplete', args=['users'])
+        response = self.client.get(url, {'q': 'An'})
+        self.assertEqual(response.json()['results'], ['Andrew', 'anna', 'annette'])
+        self.assertEqual(
+            self.client.get(reverse('autocomplete', args=['groups']), {'q': 'an'})
+            .json()['results'],
+            [{'title': 'Android', 'slug': 'android'}],
+        )
+        self.assertEqual(
+            self.client.get(reverse('autocomplete', args=['posts'])).status_code, 404
+        )
+
+    def test_signals_keep_index_current(self):
+        url = reverse('autocomplete', args=['users'])
+        self.client.get(url, {'q': 'a'})
+        User.objects.create(username='anton')
+        user = User.objects.get(username='bob')
+        user.username = 'alex'
+        user.save()
+        User.objects.get(username='anna').delete()
+        with self.assertNumQueries(0):
+            results = self.client.get(url, {'q': 'a'}).json()['results']
+        self.assertEqual(results, ['alex', 'Andrew', 'annette', 'anton'])
+
+    def test_expired_index_is_rebuilt_in_background(self):
+        source = sources['users']
+        self.assertEqual(source.search('an'), ['Andrew', 'anna', 'annette'])
+        # Переименование в другом процессе: сигналы сюда не доходят.
+        User.objects.filter(username='anna').update(username='zoe')
+        source.expires = 0.0
+        with mock.patch.object(source, 'start_rebuild') as start:
+            self.assertEqual(source.search('an'), ['Andrew', 'anna', 'annette'])
+            self.assertEqual(source.search('an'), ['Andrew', 'anna', 'annette'])
+        start.assert_called_once_with()
+        User.objects.create(username='anton')
+        source.rebuild()
+        with self.assertNumQueries(0):
+            self.assertEqual(source.search('an'), ['Andrew', 'annette', 'anton'])
+
+    def tearDown(self):
+        for source in sources.values():
+            source.index = None
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='dummy')
+        self.reader = User.objects.create(username='reader')
+        self.posts = [
+            Post.objects.create(text=f'post {i}', author=self.user)
+            for i in range(12)
+        ]
+        old = dt.datetime.now() - dt.timedelta(days=400)
+        for i, post in enumerate(self.posts[:5]):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=old + dt.timedelta(minutes=i)
+            )
+        self.old = self.posts[4]
+        Comment.objects.create(text='old comment', author=self.reader, post=self.old)
+        toggle_like(self.reader, self.old)
+
+    def test_archive_moves_old_posts(self):
+        self.assertEqual(archive(batch_size=2), 5)
+        self.assertEqual(Post.objects.count(), 7)
+        archived = ArchivedPost.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.likes_total, 1)
+        self.assertEqual(archived.comments.get().text, 'old comment')
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(archive(), 0)
+
+    def test_archived_posts_are_readable(self):
+        archive()
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('post', args=['dummy', self.old.pk]))
+        self.assertContains(response, 'old comment')
+        self.assertNotContains(response, 'Добавить комментарий:')
+
+        response = self.client.get(reverse('profile', args=['dummy']))
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertContains(response, 'Записей: 12')
+        response = self.client.get(reverse('profile', args=['dummy']), {'page': 2})
+        self.assertEqual(
+            [post.text for post in response.context['page']],
+            ['post 1', 'post 0'],
+        )
+        self.assertEqual(response.context['page'][0].likes_total, 0)
+
+    def test_stale_counts_do_not_hide_posts(self):
+        archive()
+        # Архивация прошла в другом процессе: кеш счетчиков этого процесса
+        # все еще видит все посты горячими.
+        cache.set(f'posts:count:author:{self.user.id}', 12)
+        cache.set(f'posts:count:archive:author:{self.user.id}', 0)
+        response = self.client.get(reverse('profile', args=['dummy']), {'page': 2})
+        self.assertEqual(
+            [post.text for post in response.context['page']],
+            ['post 1', 'post 0'],
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+
+class LiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='dummy')
+        self.group = Group.objects.create(title='Cats', slug='cats')
+        self.root = tempfile.mkdtemp()
+
+    def test_hub_matches_scopes(self):
+        hub = live.Hub()
+        index = live.Subscriber('index')
+        group = live.Subscriber('group:cats')
+        follow = live.Subscriber('follow', {self.user.id})
+        for subscriber in (index, group, follow):
+            hub.add(subscriber)
+        hub.publish(live.event_for(1, self.user.id, None))
+        hub.publish(live.event_for(2, 0, 'cats'))
+        self.assertEqual((index.new, group.new, follow.new), (2, 1, 1))
+        hub.remove(index)
+        hub.publish(live.event_for(3, 0, 'dogs'))
+        self.assertEqual(index.new, 2)
+
+    def test_count_starts_at_rendered_post(self):
+        subscriber = live.Subscriber('index', after=5)
+        for post_id in (4, 6, 6, 7):
+            subscriber.add(post_id)
+        self.assertEqual(subscriber.new, 2)
+        first = Post.objects.create(text='1', author=self.user)
+        second = Post.objects.create(text='2', author=self.user, group=self.group)
+        self.assertEqual(live.backlog('index', None, first.id), [second.id])
+        self.assertEqual(live.backlog('group:cats', None, 0), [second.id])
+        self.assertEqual(live.backlog('follow', {0}, 0), [])
+
+    def test_posts_before_connect_are_counted(self):
+        async def scenario():
+            hub = live.Hub()
+            server = await asyncio.start_server(
+                lambda r, w: live.serve_client(hub, r, w), '127.0.0.1', 0
+            )
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            with mock.patch.object(live, 'backlog', return_value=[11, 12]) as found:
+                writer.write(b'GET /live/?scope=index&after=10 HTTP/1.1\r\n\r\n')
+                await reader.readuntil(b'retry: 5000\n\n')
+                line = await asyncio.wait_for(reader.readuntil(b'}\n\n'), 5)
+            hub.publish(live.event_for(12, 0, None))
+            hub.publish(live.event_for(13, 0, None))
+            more = await asyncio.wait_for(reader.readuntil(b'}\n\n'), 5)
+            writer.close()
+            server.close()
+            return found.call_args[0], line, more
+
+        args, line, more = asyncio.run(scenario())
+        self.assertEqual(args, ('index', None, 10))
+        self.assertIn(b'"new": 2', line)
+        self.assertIn(b'"new": 3', more)
+
+    def test_socket_events_reach_subscribers(self):
+        path = os.path.join(self.root, 'live.sock')
+
+        async def scenario():
+            hub = live.Hub()
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: live.BrokerProtocol(hub),
+                local_addr=path,
+                family=live.socket.AF_UNIX,
+            )
+            server = await asyncio.start_server(
+                lambda r, w: live.serve_client(hub, r, w), '127.0.0.1', 0
+            )
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /live/?scope=group:cats HTTP/1.1\r\n\r\n')
+            head = await reader.readuntil(b'retry: 5000\n\n')
+            while not hub.subscribers:
+                await asyncio.sleep(0.01)
+            with override_settings(LIVE_SOCKET=path):
+                live.publish(live.event_for(1, self.user.id, 'cats'))
+                live.publish(live.event_for(2, self.user.id, 'dogs'))
+                live.publish(live.event_for(3, self.user.id, 'cats'))
+            lines = []
+            while b'"new": 2' not in b''.join(lines):
+                lines.append(await asyncio.wait_for(reader.readline(), 5))
+            writer.close()
+            server.close()
+            transport.close()
+            return head, b''.join(lines)
+
+        head, body = asyncio.run(scenario())
+        self.assertIn(b'text/event-stream', head)
+        self.assertIn(b'event: posts', body)
+
+    def test_follow_scope_checks_session_hash(self):
+        author = User.objects.create(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        self.user.set_password('Pass-1234')
+        self.user.save()
+        self.client.force_login(self.user)
+        session_key = self.client.session.session_key
+        self.assertEqual(live.followed_authors(session_key), {author.id})
+        self.user.set_password('Other-5678')
+        self.user.save()
+        self.assertIsNone(live.followed_authors(session_key))
+        self.assertIsNone(live.followed_authors('missing'))
+
+    @override_settings(LIVE_REQUEST_TIMEOUT=0.1)
+    def test_silent_client_is_dropped(self):
+        async def scenario():
+            server = await asyncio.start_server(
+                lambda r, w: live.serve_client(live.Hub(), r, w), '127.0.0.1', 0
+            )
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /live/?scope=index HTTP/1.1\r\n')
+            data = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            server.close()
+            return data
+
+        self.assertEqual(asyncio.run(scenario()), b'')
+
+    def test_fallback_count(self):
+        first = Post.objects.create(text='1', author=self.user)
+        Post.objects.create(text='2', author=self.user, group=self.group)
+        Post.objects.create(text='3', author=self.user)
+        url = reverse('live_count')
+        self.assertEqual(
+            self.client.get(url, {'scope': 'index', 'after': first.id}).json(),
+            {'new': 2},
+        )
+        self.assertEqual(
+            self.client.get(url, {'scope': 'group:cats', 'after': 0}).json(),
+            {'new': 1},
+        )
+        self.assertEqual(self.client.get(url, {'scope': 'follow'}).status_code, 403)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'live-notice')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,98 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Comment, Follow, Like, Post, PostScore, Watermark
+
+
+def decay(age):
+    return 0.5 ** (max(age, 0) / settings.TRENDING_HALF_LIFE)
+
+
+def update_scores(batch_size=None):
+    """Старит накопленные рейтинги и добавляет события с прошлого запуска.
+
+    Каждое событие (пост, комментарий, лайк, подписка на автора, просмотр)
+    весит TRENDING_WEIGHTS[вид] и затухает вдвое за TRENDING_HALF_LIFE
+    секунд. Возвращает число учтенных событий.
+    """
+    batch_size = batch_size or settings.TRENDING_BATCH_SIZE
+    weights = settings.TRENDING_WEIGHTS
+    now = timezone.now()
+    gains = Counter()
+
+    def age(moment):
+        return (now - moment).total_seconds()
+
+    with transaction.atomic():
+        clock = Watermark.get('trending:clock')
+        if clock.position:
+            factor = decay(now.timestamp() - clock.position)
+            PostScore.objects.update(score=F('score') * factor)
+            PostScore.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+        clock.position = int(now.timestamp())
+        clock.save()
+
+        for _, post_id, pub_date in Watermark.get('trending:posts').read_after(
+            Post.objects.all(), ['id', 'pub_date'], batch_size
+        ):
+            gains[post_id] += weights['post'] * decay(age(pub_date))
+        for _, post_id, created in Watermark.get('trending:comments').read_after(
+            Comment.objects.all(), ['post_id', 'created'], batch_size
+        ):
+            gains[post_id] += weights['comment'] * decay(age(created))
+        for _, post_id, created in Watermark.get('trending:likes').read_after(
+            Like.objects.all(), ['post_id', 'created'], batch_size
+        ):
+            gains[post_id] += weights['like'] * decay(age(created))
+        follows = Watermark.get('trending:follows').read_after(
+            Follow.objects.all(), ['author_id'], batch_size
+        )
+        latest = latest_posts({author_id for _, author_id in follows})
+        for _, author_id in follows:
+            if author_id in latest:
+                gains[latest[author_id]] += weights['follow']
+
+        viewed = PostScore.objects.filter(post__views__gt=F('views_seen'))
+        for post_id, views, seen in viewed.values_list(
+            'post_id', 'post__views', 'views_seen'
+        )[:batch_size]:
+            gains[post_id] += weights['view'] * (views - seen)
+
+        apply_gains(gains)
+    return len(gains)
+
+
+def latest_posts(author_ids):
+    return dict(
+        Post.objects.filter(author_id__in=author_ids).order_by()
+        .values_list('author_id').annotate(latest=Max('id'))
+    )
+
+
+def apply_gains(gains):
+    posts = Post.objects.filter(pk__in=gains).values_list('id', 'group_id', 'views')
+    scores = PostScore.objects.in_bulk(list(gains))
+    created, changed = [], []
+    for post_id, group_id, views in posts:
+        item = scores.get(post_id)
+        if item is None:
+            item = PostScore(post_id=post_id, score=0)
+            created.append(item)
+        else:
+            changed.append(item)
+        item.score += gains[post_id]
+        item.group_id = group_id
+        item.views_seen = views
+    PostScore.objects.bulk_create(created)
+    PostScore.objects.bulk_update(changed, ['score', 'group', 'views_seen'])
+
+
+def trending_posts(group=None):
+    scores = PostScore.objects.select_related('post__author', 'post__group')
+    if group is not None:
+        scores = scores.filter(group=group)
+    return [item.post for item in scores[:settings.TRENDING_TOP]]
@@ -1,13 +1,40 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import feeds, views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    re_path(r'^(?P<name>sitemap[\w-]*\.xml)$', views.sitemap, name='sitemap'),
+    path('trending/', views.trending, name='trending'),
+    path('groups/', views.group_index, name='group_index'),
+    path('tag/<str:name>/', views.tag_feed, name='tag'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('group/<slug:slug>/feed/', feeds.group_feed, name='group_feed'),
+    path(
+        'group/<slug:slug>/trending/',
+        views.group_trending,
+        name='group_trending'
+    ),
     path('new/', views.new_post, name='new_post'),
     path("follow/", views.follow_index, name="follow_index"),
+    path('notifications/', views.notifications, name='notifications'),
+    path(
+        'notifications/count/',
+        views.notifications_count,
+        name='notifications_count'
+    ),
+    path('mentions/', views.mentions, name='mentions'),
+    path('live/count/', views.live_count, name='live_count'),
+    path(
+        'autocomplete/<str:kind>/',
+        views.autocomplete,
+        name='autocomplete'
+    ),
+    path('status/load/', views.load_status, name='load_status'),
+    path('status/analytics/', views.analytics, name='analytics'),
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/export/', views.profile_export, name='profile_export'),
+    path('<str:username>/feed/', feeds.author_feed, name='author_feed'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path(
         '<str:username>/<int:post_id>/edit/',
@@ -15,6 +42,7 @@ urlpatterns = [
         name='post_edit'
     ),
     path('<str:username>/<int:post_id>/comment', views.add_comment, name='add_comment'),
+    path('<str:username>/<int:post_id>/like/', views.post_like, name='post_like'),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"),
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
 ]
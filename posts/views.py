@@ -1,20 +1,61 @@
 import datetime as dt
+from functools import wraps
 
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import is_safe_url
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_safe
 
+from .analytics import dashboard
+from .archive import find_archived
+from .autocomplete import sources
+from .counters import view_counter
+from .dump import export_lines
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .likes import attach_likes, toggle_like
+from .loader import get_loader
+from .media import serve_file
+from .middleware import load_shedder
+from .models import (
+    Comment, Follow, FollowSuggestion, GroupStats, Post, Tag, User
+)
+from .notifications import mark_read, unread_count
+from .paginator import ChainedList, keyset_page, posts_paginator
+from .ratelimit import ratelimit, stats as ratelimit_stats
+from .trending import trending_posts
 
 
-@cache_page(20, key_prefix='index_page')
+def cache_anonymous(timeout, key_prefix):
+    """cache_page только для анонимов.
+
+    Страница вошедшего пользователя содержит его лайки и CSRF-токен в
+    формах, поэтому отдавать ее из общего кеша другим нельзя.
+    """
+    def decorator(view):
+        cached = cache_page(timeout, key_prefix=key_prefix)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            return cached(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@cache_anonymous(20, key_prefix='index_page')
 def index(request):
     post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
+    paginator = posts_paginator(post_list, 'index')
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
+    get_loader(request).attach(page)
+    attach_likes(page, request.user)
     return render(
         request,
         'index.html',
@@ -23,11 +64,13 @@ def index(request):
 
 
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = get_loader(request).group(slug)
     post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
+    paginator = posts_paginator(post_list, f'group:{group.id}')
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
+    get_loader(request).attach(page)
+    attach_likes(page, request.user)
     return render(
         request,
         'group.html',
@@ -35,7 +78,84 @@ def group_posts(request, slug):
     )
 
 
+def trending(request):
+    paginator = Paginator(trending_posts(), 10)
+    page_number = request.GET.get('page')
+    page = paginator.get_page(page_number)
+    get_loader(request).attach(page)
+    attach_likes(page, request.user)
+    return render(
+        request,
+        'trending.html',
+        {'page': page, 'paginator': paginator}
+    )
+
+
+def group_trending(request, slug):
+    group = get_loader(request).group(slug)
+    paginator = Paginator(trending_posts(group), 10)
+    page_number = request.GET.get('page')
+    page = paginator.get_page(page_number)
+    get_loader(request).attach(page)
+    attach_likes(page, request.user)
+    return render(
+        request,
+        'group.html',
+        {'group': group, 'page': page, 'paginator': paginator, 'trending': True}
+    )
+
+
+def group_index(request):
+    paginator = Paginator(
+        GroupStats.objects.select_related('group'), settings.GROUPS_PER_PAGE
+    )
+    page_number = request.GET.get('page')
+    page = paginator.get_page(page_number)
+    return render(
+        request,
+        'groups.html',
+        {'page': page, 'paginator': paginator}
+    )
+
+
+def keyset_feed(request, queryset):
+    try:
+        before = int(request.GET.get('before', 0))
+    except ValueError:
+        raise Http404
+    posts, next_before = keyset_page(
+        queryset.select_related('author'), before, settings.TAG_FEED_PAGE
+    )
+    get_loader(request).attach(posts)
+    attach_likes(posts, request.user)
+    return posts, next_before
+
+
+def tag_feed(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    posts, next_before = keyset_feed(
+        request, Post.objects.filter(post_tags__tag=tag)
+    )
+    return render(request, 'tag.html', {
+        'tag': tag,
+        'posts': posts,
+        'next_before': next_before,
+    })
+
+
+@login_required
+def mentions(request):
+    posts, next_before = keyset_feed(
+        request, Post.objects.filter(mentions__user=request.user)
+    )
+    return render(request, 'mentions.html', {
+        'posts': posts,
+        'next_before': next_before,
+    })
+
+
 @login_required
+@ratelimit('new_post', methods=['POST'])
 def new_post(request):
     f = PostForm(request.POST or None)
     if f.is_valid():
@@ -46,11 +166,16 @@ def new_post(request):
 
 
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.select_related('author').all()
+    user = get_loader(request).author(username)
+    post_list = ChainedList(
+        user.posts.all(), user.hot_posts_count,
+        user.archived_posts.all(), user.posts_count - user.hot_posts_count,
+    )
     paginator = Paginator(post_list, 10)
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
+    get_loader(request).attach(page)
+    attach_likes([post for post in page if not post.archived], request.user)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -60,25 +185,48 @@ def profile(request, username):
         'page': page,
         'paginator': paginator,
         'post_author': user,
-        'following': following
+        'following': following,
+        'suggestions': follow_suggestions(request.user),
         })
 
 
+@login_required
+def profile_export(request, username):
+    if request.user.username != username:
+        return HttpResponseForbidden()
+    response = StreamingHttpResponse(
+        export_lines([request.user.posts.all()], 500),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{username}-posts.jsonl"'
+    return response
+
+
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
-    items = post.comments.all()
+    loader = get_loader(request)
+    author = loader.author(username)
+    try:
+        post = loader.post(post_id, author.username)
+    except Http404:
+        post = find_archived(post_id, author)
+        if post is None:
+            raise
+    else:
+        view_counter.hit(post.id)
+        attach_likes([post], request.user)
+    items = post.comments.select_related('author')
     f = CommentForm()
     return render(request, 'post.html', {
         'form': f,
         'items': items,
         'post': post,
-        'post_author': post.author,
+        'post_author': author,
     })
 
 
 @login_required
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    post = get_loader(request).post(post_id, username)
     f = PostForm(request.POST or None, files=request.FILES or None, instance=post)
     if post.author == request.user:
         if f.is_valid():
@@ -90,15 +238,32 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@ratelimit('add_comment', methods=['POST'])
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    loader = get_loader(request)
+    post = loader.post(post_id, username)
     f = CommentForm(request.POST or None)
     if f.is_valid():
         f.instance.author = request.user
-        f.instance.post_id = post_id
+        f.instance.post = post
         f.save()
         return redirect('post', username=username, post_id=post_id)
-    return render(request, 'post.html', {'form': f, 'post': post, 'post_author': post.author})
+    return render(request, 'post.html', {
+        'form': f,
+        'post': post,
+        'post_author': loader.author(username),
+    })
+
+
+@login_required
+def post_like(request, username, post_id):
+    post = get_loader(request).post(post_id, username)
+    if request.method == 'POST':
+        toggle_like(request.user, post)
+    next_url = request.POST.get('next')
+    if next_url and is_safe_url(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('post', username=username, post_id=post_id)
 
 
 @login_required
@@ -107,10 +272,17 @@ def follow_index(request):
     paginator = Paginator(post_list, 10)
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
-    return render(request, "follow.html", {'page': page, 'paginator': paginator})
+    get_loader(request).attach(page)
+    attach_likes(page, request.user)
+    return render(request, "follow.html", {
+        'page': page,
+        'paginator': paginator,
+        'suggestions': follow_suggestions(request.user),
+    })
 
 
 @login_required
+@ratelimit('follow')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -119,6 +291,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@ratelimit('follow')
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = get_object_or_404(Follow, user=request.user, author=author)
@@ -126,6 +299,79 @@ def profile_unfollow(request, username):
     return redirect('profile', username=username)
 
 
+def follow_suggestions(user):
+    if not user.is_authenticated:
+        return []
+    return list(
+        FollowSuggestion.objects.filter(user=user)
+        .exclude(suggested__following__user=user)
+        .select_related('suggested')[:settings.SUGGESTIONS_SHOWN]
+    )
+
+
+@login_required
+def notifications(request):
+    items = list(
+        request.user.notifications.select_related('author', 'last_post')[:50]
+    )
+    mark_read(request.user.id)
+    return render(request, 'notifications.html', {'items': items})
+
+
+@login_required
+def notifications_count(request):
+    return JsonResponse({'unread': unread_count(request.user.id)})
+
+
+@require_safe
+def sitemap(request, name):
+    return serve_file(request, settings.SITEMAP_ROOT, name)
+
+
+@require_safe
+def live_count(request):
+    """Запасной вариант для клиентов без SSE: число постов после after."""
+    scope = request.GET.get('scope', '')
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        raise Http404
+    posts = Post.objects.filter(id__gt=after)
+    if scope == 'follow':
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden()
+        posts = posts.filter(author__following__user=request.user)
+    elif scope.startswith('group:'):
+        posts = posts.filter(group__slug=scope[len('group:'):])
+    elif scope != 'index':
+        raise Http404
+    new = len(posts.order_by().values_list('id', flat=True)[:100])
+    return JsonResponse({'new': new})
+
+
+@require_safe
+def autocomplete(request, kind):
+    if kind not in sources:
+        raise Http404
+    prefix = request.GET.get('q', '').strip()
+    results = sources[kind].search(prefix) if prefix else []
+    response = JsonResponse({'results': results})
+    response['Cache-Control'] = f'public, max-age={settings.AUTOCOMPLETE_MAX_AGE}'
+    return response
+
+
+@staff_member_required
+def load_status(request):
+    state = load_shedder.state()
+    state['ratelimit'] = dict(ratelimit_stats)
+    return JsonResponse(state)
+
+
+@staff_member_required
+def analytics(request):
+    return render(request, 'analytics.html', dashboard())
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -0,0 +1,82 @@
+import logging
+import os
+
+from django.template import engines
+from django.test import Client
+from django.urls import get_resolver, reverse
+
+from .counters import view_counter
+from .models import Group, Post
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine):
+    names = set()
+    for loader in engine.template_loaders:
+        for source in getattr(loader, 'loaders', [loader]):
+            for directory in source.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for filename in files:
+                        path = os.path.join(root, filename)
+                        names.add(os.path.relpath(path, directory))
+    return sorted(names)
+
+
+def warm_templates():
+    engine = engines['django'].engine
+    names = template_names(engine)
+    for name in names:
+        engine.get_template(name)
+    return len(names)
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def hot_urls():
+    urls = [reverse('index')]
+    post = Post.objects.select_related('author').first()
+    if post is not None:
+        urls.append(reverse('profile', args=[post.author.username]))
+        urls.append(reverse('post', args=[post.author.username, post.id]))
+    group = Group.objects.first()
+    if group is not None:
+        urls.append(reverse('group', args=[group.slug]))
+    return urls
+
+
+def warm_views():
+    client = Client()
+    urls = hot_urls()
+    # Прогревочные запросы — не настоящие просмотры постов.
+    with view_counter.paused():
+        for url in urls:
+            try:
+                client.get(url)
+            except Exception:
+                logger.exception('Прогрев %s не удался', url)
+    return urls
+
+
+def attempt(stage, default):
+    try:
+        return stage()
+    except Exception:
+        logger.exception('Прогрев (%s) не удался', stage.__name__)
+        return default
+
+
+def warm_up():
+    """Прогревает процесс; ошибки прогрева только логируются."""
+    templates = attempt(warm_templates, 0)
+    patterns = attempt(warm_urls, 0)
+    urls = attempt(warm_views, [])
+    logger.info(
+        'Прогрев: шаблонов %s, маршрутов %s, страниц %s',
+        templates, patterns, len(urls)
+    )
+    return templates, patterns, urls
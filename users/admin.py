@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import OutboxMessage
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'subject', 'status', 'attempts', 'created', 'sent',)
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients',)
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -0,0 +1,35 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+_users = {}
+_lock = threading.Lock()
+
+
+def forget_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который держит пользователей в памяти процесса.
+
+    Каждый запрос получает свою копию объекта. Запись живет
+    AUTH_USER_CACHE_TTL секунд и сбрасывается при сохранении пользователя
+    (в том числе при смене пароля) и при выходе из аккаунта.
+    """
+
+    def get_user(self, user_id):
+        now = time.monotonic()
+        entry = _users.get(user_id)
+        if entry is not None and entry[0] > now:
+            return copy.copy(entry[1])
+        user = super().get_user(user_id)
+        if user is not None:
+            with _lock:
+                _users[user_id] = (now + settings.AUTH_USER_CACHE_TTL, user)
+            user = copy.copy(user)
+        return user
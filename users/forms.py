@@ -1,10 +1,42 @@
+import re
+
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import URLResolver, get_resolver
 
 User = get_user_model()
 
+LITERAL = re.compile(r'^[\w.@+-]+$')
+
+
+def reserved_usernames(patterns=None):
+    """Первые сегменты фиксированных адресов сайта.
+
+    Профиль открывается по /<username>/ и стоит в urls.py после них, так
+    что пользователь с таким именем остался бы без страницы.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = set()
+    for pattern in patterns:
+        route = str(pattern.pattern).lstrip('^')
+        if not route and isinstance(pattern, URLResolver):
+            names |= reserved_usernames(pattern.url_patterns)
+            continue
+        segment = route.split('/', 1)[0]
+        if '/' in route and LITERAL.match(segment):
+            names.add(segment.lower())
+    return names
+
 
 class CreationForm(UserCreationForm):
     class Meta:
         model = User
         fields = ('first_name', 'last_name', 'username', 'email',)
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username.lower() in reserved_usernames():
+            raise forms.ValidationError('Это имя занято адресом сайта.')
+        return username
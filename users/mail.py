@@ -0,0 +1,133 @@
+import datetime as dt
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxMessage, dump_attachments
+
+
+def dedupe_key(message, attachments):
+    digest = hashlib.sha256()
+    for part in (message.subject, message.body, attachments, *message.recipients()):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def enqueue(email_messages):
+    now = timezone.now()
+    window = now - dt.timedelta(seconds=settings.OUTBOX_DEDUPE_WINDOW)
+    keys = {}
+    for message in email_messages:
+        attachments = dump_attachments(message.attachments)
+        keys[dedupe_key(message, attachments)] = message, attachments
+    seen = set(
+        OutboxMessage.objects.filter(dedupe_key__in=keys, created__gte=window)
+        .exclude(status=OutboxMessage.FAILED)
+        .values_list('dedupe_key', flat=True)
+    )
+    OutboxMessage.objects.bulk_create(
+        OutboxMessage(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email,
+            recipients=json.dumps({
+                'to': message.to,
+                'cc': message.cc,
+                'bcc': message.bcc,
+                'reply_to': message.reply_to,
+            }),
+            alternatives=json.dumps(getattr(message, 'alternatives', [])),
+            attachments=attachments,
+            headers=json.dumps(message.extra_headers),
+            dedupe_key=key,
+            next_attempt=now,
+        )
+        for key, (message, attachments) in keys.items() if key not in seen
+    )
+    return len(email_messages)
+
+
+def claim(batch_size, now):
+    """Забирает пачку писем этому отправителю одним атомарным UPDATE.
+
+    Параллельный send_outbox получит другие строки; занятые строки упавшего
+    отправителя снова становятся доступны после OUTBOX_LOCK_SECONDS.
+    """
+    token = uuid.uuid4().hex
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ids = list(
+        OutboxMessage.objects.filter(
+            free, status=OutboxMessage.PENDING, next_attempt__lte=now
+        )
+        .values_list('id', flat=True)[:batch_size]
+    )
+    OutboxMessage.objects.filter(free, id__in=ids).update(
+        claimed_by=token,
+        locked_until=now + dt.timedelta(seconds=settings.OUTBOX_LOCK_SECONDS),
+    )
+    return list(OutboxMessage.objects.filter(id__in=ids, claimed_by=token))
+
+
+def retry_later(item, error, now):
+    item.last_error = repr(error)
+    if item.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        item.status = OutboxMessage.FAILED
+    else:
+        delay = settings.OUTBOX_RETRY_DELAY * 2 ** (item.attempts - 1)
+        item.next_attempt = now + dt.timedelta(seconds=delay)
+
+
+def deliver(batch_size=None):
+    """Отправляет накопившиеся письма через одно соединение.
+
+    Неудачные письма откладываются с экспоненциальной задержкой, после
+    OUTBOX_MAX_ATTEMPTS попыток помечаются как FAILED. Если не удалось даже
+    открыть соединение, попытка засчитывается всей пачке.
+    """
+    now = timezone.now()
+    batch = claim(batch_size or settings.OUTBOX_BATCH_SIZE, now)
+    if not batch:
+        return 0
+    for item in batch:
+        item.attempts += 1
+    connection = get_connection(settings.OUTBOX_DELIVERY_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        for item in batch:
+            retry_later(item, error, now)
+    else:
+        try:
+            for item in batch:
+                try:
+                    connection.send_messages([item.as_email(connection)])
+                except Exception as error:
+                    retry_later(item, error, now)
+                else:
+                    item.status = OutboxMessage.SENT
+                    item.sent = timezone.now()
+        finally:
+            connection.close()
+    for item in batch:
+        item.locked_until = None
+    OutboxMessage.objects.bulk_update(batch, [
+        'status', 'attempts', 'next_attempt', 'last_error', 'sent',
+        'locked_until',
+    ])
+    return len(batch)
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Только кладет письма в очередь; отправляет их команда send_outbox."""
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        return enqueue(email_messages)
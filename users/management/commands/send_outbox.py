@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.mail import deliver
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--loop', action='store_true')
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            while deliver(options['batch_size']):
+                pass
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
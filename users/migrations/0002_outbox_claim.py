@@ -0,0 +1,23 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='занято до'),
+        ),
+    ]
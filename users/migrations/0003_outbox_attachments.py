@@ -0,0 +1,23 @@
+# Generated by Django 2.2.9 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_outbox_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='attachments',
+            field=models.TextField(default='[]', verbose_name='вложения'),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='headers',
+            field=models.TextField(default='{}', verbose_name='заголовки'),
+        ),
+    ]
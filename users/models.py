@@ -1,3 +1,109 @@
+import base64
+import email
+import json
+from email.message import Message
+from email.mime.base import MIMEBase
+
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
 
-# Create your models here.
+
+class StoredPart(MIMEBase):
+    """MIME-часть вложения, разобранная из сохраненных байтов."""
+
+    def __init__(self):
+        Message.__init__(self)
+
+
+def dump_attachments(attachments):
+    """Вложения EmailMessage в JSON: байты кодируются в base64."""
+    items = []
+    for attachment in attachments:
+        if isinstance(attachment, MIMEBase):
+            items.append({
+                'mime': base64.b64encode(attachment.as_bytes()).decode('ascii'),
+            })
+            continue
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            items.append({'filename': filename, 'text': content, 'mimetype': mimetype})
+        else:
+            items.append({
+                'filename': filename,
+                'data': base64.b64encode(content).decode('ascii'),
+                'mimetype': mimetype,
+            })
+    return json.dumps(items)
+
+
+def load_attachments(data):
+    attachments = []
+    for item in json.loads(data):
+        if 'mime' in item:
+            raw = base64.b64decode(item['mime'])
+            attachments.append(email.message_from_bytes(raw, _class=StoredPart))
+        elif 'text' in item:
+            attachments.append((item['filename'], item['text'], item['mimetype']))
+        else:
+            content = base64.b64decode(item['data'])
+            attachments.append((item['filename'], content, item['mimetype']))
+    return attachments
+
+
+class OutboxMessage(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'ждет отправки'),
+        (SENT, 'отправлено'),
+        (FAILED, 'не удалось отправить'),
+    )
+
+    subject = models.TextField(verbose_name='тема')
+    body = models.TextField(verbose_name='текст')
+    from_email = models.CharField(verbose_name='отправитель', max_length=254)
+    recipients = models.TextField(verbose_name='получатели')
+    alternatives = models.TextField(verbose_name='альтернативы', default='[]')
+    attachments = models.TextField(verbose_name='вложения', default='[]')
+    headers = models.TextField(verbose_name='заголовки', default='{}')
+    dedupe_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(
+        verbose_name='статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name='попыток', default=0)
+    next_attempt = models.DateTimeField(verbose_name='следующая попытка', db_index=True)
+    last_error = models.TextField(verbose_name='последняя ошибка', blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(
+        verbose_name='занято до', blank=True, null=True
+    )
+    created = models.DateTimeField('создано', auto_now_add=True)
+    sent = models.DateTimeField('отправлено', blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.subject} → {", ".join(json.loads(self.recipients)["to"])}'
+
+    def as_email(self, connection=None):
+        recipients = json.loads(self.recipients)
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=recipients['to'],
+            cc=recipients['cc'],
+            bcc=recipients['bcc'],
+            reply_to=recipients['reply_to'],
+            headers=json.loads(self.headers),
+            connection=connection,
+        )
+        for content, mimetype in json.loads(self.alternatives):
+            message.attach_alternative(content, mimetype)
+        message.attachments = load_attachments(self.attachments)
+        return message
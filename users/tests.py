@@ -1,3 +1,150 @@
-from django.test import TestCase
+import datetime as dt
+from email.mime.text import MIMEText
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, send_mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import CreationForm
+from .mail import deliver
+from .models import OutboxMessage
+
+User = get_user_model()
+
+
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='dummy', password='Pass-1234')
+        self.client = Client()
+        self.client.login(username='dummy', password='Pass-1234')
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.status_code, 200)
+        return [
+            q['sql'] for q in queries.captured_queries
+            if 'django_session' in q['sql'] or 'FROM "auth_user"' in q['sql']
+        ]
+
+    def test_repeated_requests_skip_session_and_user_queries(self):
+        self.auth_queries()
+        self.assertEqual(self.auth_queries(), [])
+
+    def test_password_change_invalidates_cached_user(self):
+        self.auth_queries()
+        self.user.set_password('Other-5678')
+        self.user.save()
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.status_code, 302)
+
+
+class SignUpTest(TestCase):
+    def form(self, username):
+        return CreationForm({
+            'username': username, 'email': 'a@example.com',
+            'password1': 'Pass-1234-x', 'password2': 'Pass-1234-x',
+        })
+
+    def test_fixed_url_segments_are_reserved(self):
+        for username in ('trending', 'Mentions', 'autocomplete', 'admin', 'new'):
+            with self.subTest(username=username):
+                self.assertIn('username', self.form(username).errors)
+        self.assertTrue(self.form('trendy').is_valid())
+
+
+class BrokenBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('smtp is down')
+
+
+class UnreachableBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('no route to smtp')
+
+
+@override_settings(
+    EMAIL_BACKEND='users.mail.OutboxBackend',
+    OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(
+            username='dummy', email='dummy@example.com', password='Pass-1234'
+        )
+
+    def reset_password(self):
+        return self.client.post(
+            reverse('password_reset'), {'email': 'dummy@example.com'}
+        )
+
+    def test_password_reset_only_enqueues(self):
+        self.reset_password()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(deliver(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['dummy@example.com'])
+        self.assertEqual(OutboxMessage.objects.get().status, OutboxMessage.SENT)
+
+    def test_attachments_and_headers_survive_the_outbox(self):
+        message = EmailMessage(
+            'report', 'see attached', 'from@example.com', ['dummy@example.com'],
+            headers={'X-Report': 'daily'},
+        )
+        message.attach('notes.txt', 'привет', 'text/plain')
+        message.attach('data.bin', b'\x00\xff', 'application/octet-stream')
+        message.attach(MIMEText('inline part'))
+        message.send()
+        self.assertEqual(deliver(), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.extra_headers, {'X-Report': 'daily'})
+        self.assertEqual(sent.attachments[:2], [
+            ('notes.txt', 'привет', 'text/plain'),
+            ('data.bin', b'\x00\xff', 'application/octet-stream'),
+        ])
+        self.assertEqual(sent.attachments[2].get_payload(), 'inline part')
+        self.assertIn('X-Report: daily', sent.message().as_string())
+
+    def test_identical_messages_are_deduped(self):
+        send_mail('hi', 'text', 'from@example.com', ['dummy@example.com'])
+        send_mail('hi', 'text', 'from@example.com', ['dummy@example.com'])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    @override_settings(OUTBOX_DELIVERY_BACKEND='users.tests.BrokenBackend')
+    def test_failed_delivery_is_retried_later(self):
+        send_mail('hi', 'text', 'from@example.com', ['dummy@example.com'])
+        deliver()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('smtp is down', message.last_error)
+        self.assertEqual(deliver(), 0)
+
+    @override_settings(OUTBOX_DELIVERY_BACKEND='users.tests.UnreachableBackend')
+    def test_connect_failure_counts_as_attempt(self):
+        send_mail('hi', 'text', 'from@example.com', ['dummy@example.com'])
+        self.assertEqual(deliver(), 1)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 1))
+        self.assertIn('no route to smtp', message.last_error)
+        self.assertIsNone(message.locked_until)
+
+    def test_claimed_messages_are_skipped(self):
+        send_mail('hi', 'text', 'from@example.com', ['dummy@example.com'])
+        send_mail('bye', 'text', 'from@example.com', ['dummy@example.com'])
+        first = OutboxMessage.objects.first()
+        OutboxMessage.objects.filter(pk=first.pk).update(
+            claimed_by='other', locked_until=timezone.now() + dt.timedelta(minutes=5)
+        )
+        self.assertEqual(deliver(), 1)
+        self.assertEqual([m.subject for m in mail.outbox], ['bye'])
+        self.assertEqual(OutboxMessage.objects.get(pk=first.pk).status, OutboxMessage.PENDING)
@@ -2,7 +2,7 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'e_*j&-9sw21t&s-bqbnr!qn%bjf+ctk4j0t4*((b!wo(vjzpd('
-DEBUG = True
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
         '*',
@@ -31,10 +31,12 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'posts.middleware.PrerenderMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.middleware.LoadSheddingMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -57,6 +59,18 @@ TEMPLATES = [
     },
 ]
 
+# В бою шаблоны компилируются один раз на процесс.
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+TEMPLATE_WARMUP = not DEBUG
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
@@ -102,11 +116,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+# Сколько секунд процесс может отдавать пользователя из памяти, не сверяясь
+# с БД; столько же может жить сессия после смены пароля в другом процессе.
+AUTH_USER_CACHE_TTL = 30
+
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = 'users.mail.OutboxBackend'
+
+OUTBOX_DELIVERY_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_DEDUPE_WINDOW = 600
+OUTBOX_POLL_INTERVAL = 5
+OUTBOX_LOCK_SECONDS = 300
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -117,3 +146,119 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+PURGE_BATCH_SIZE = 500
+PURGE_MAX_LOCK_SECONDS = 0.5
+
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = [480, 720, 960]
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+POST_IMAGE_EAGER = 2
+
+MEDIA_MAX_AGE = 3600
+MEDIA_OFFLOAD = None  # 'x-accel-redirect' для nginx, 'x-sendfile' для apache
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+NOTIFICATIONS_BATCH_SIZE = 500
+NOTIFICATIONS_INTERVAL = 30
+NOTIFICATIONS_COUNT_TTL = 300
+
+VIEW_COUNTER_MAX_PENDING = 200
+VIEW_COUNTER_INTERVAL = 10
+VIEW_COUNTER_BATCH_SIZE = 500
+
+LIKE_COUNTER_SHARDS = 8
+
+TRENDING_WEIGHTS = {
+    'post': 1.0,
+    'comment': 3.0,
+    'like': 2.0,
+    'follow': 5.0,
+    'view': 0.1,
+}
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_MIN_SCORE = 0.01
+TRENDING_BATCH_SIZE = 1000
+TRENDING_INTERVAL = 60
+TRENDING_TOP = 200
+
+SUGGESTIONS_LIMIT = 10
+SUGGESTIONS_WORKERS = None  # по умолчанию по числу ядер
+SUGGESTIONS_SHOWN = 5
+
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+SITEMAP_CHUNK = 50000
+SITEMAP_PROTOCOL = 'https'
+
+# Пререндер включается созданием каталога (manage.py prerender --all).
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+PRERENDER_PAGES = 3
+PRERENDER_MAX_AGE = 300
+PRERENDER_INTERVAL = 10
+
+POSTS_COUNT_TTL = 600
+POSTS_COUNT_EXACT_LIMIT = 10000
+POSTS_COUNT_ESTIMATE_TTL = 6 * 60 * 60
+
+SHED_INITIAL_LIMIT = 20
+SHED_MAX_LIMIT = 100
+SHED_TARGET_LATENCY = 0.5
+SHED_DECREASE = 0.9
+SHED_LOW_FRACTION = 0.5
+SHED_EWMA_ALPHA = 0.1
+SHED_RETRY_AFTER = 5
+SHED_RECOVER_AFTER = 1.0
+# Общий каталог счетчиков для нескольких процессов (gunicorn sync): без
+# него лимит считается по потокам одного процесса.
+SHED_SHARED_DIR = os.environ.get('YATUBE_SHED_DIR', '')
+SHED_DEEP_PAGE = 5
+SHED_PROTECTED = ['post', 'media', 'login']
+SHED_LOW_PRIORITY = [
+    'follow_index',
+    'trending',
+    'group_trending',
+    'profile_export',
+    'sitemap',
+    'author_feed',
+    'group_feed',
+]
+
+RATELIMITS = {
+    'new_post': '10/m',
+    'add_comment': '20/m',
+    'follow': '30/m',
+}
+RATELIMIT_IP_HEADER = 'REMOTE_ADDR'
+RATELIMIT_IP_MULTIPLIER = 5
+
+GROUP_CACHE_TTL = 60
+
+GROUP_RECENT_AUTHORS = 5
+GROUPS_PER_PAGE = 30
+
+ROLLUP_BATCH_SIZE = 5000
+ROLLUP_INTERVAL = 300
+ANALYTICS_DAYS = 30
+ANALYTICS_TOP_GROUPS = 10
+
+TAG_FEED_PAGE = 10
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_TTL = 300
+AUTOCOMPLETE_REFRESH = 10
+AUTOCOMPLETE_MAX_AGE = 60
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 200
+ARCHIVE_PAUSE = 0.1
+
+# Живые обновления: сервер live_server за прокси по адресу LIVE_URL.
+LIVE_URL = os.environ.get('YATUBE_LIVE_URL', '')
+LIVE_SOCKET = os.environ.get('YATUBE_LIVE_SOCKET', '')
+LIVE_HOST = '127.0.0.1'
+LIVE_PORT = 8001
+LIVE_POLL_INTERVAL = 2
+LIVE_HEARTBEAT = 15
+LIVE_REQUEST_TIMEOUT = 10
+LIVE_RETRY_MS = 5000
+LIVE_FALLBACK_POLL_MS = 30000
@@ -3,7 +3,9 @@ from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.flatpages import views
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from posts import media
 
 handler404 = "posts.views.page_not_found" # noqa
 handler500 = "posts.views.server_error" # noqa
@@ -13,6 +15,11 @@ urlpatterns = [
     path('about/', include('django.contrib.flatpages.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    re_path(
+        r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'),
+        media.serve,
+        name='media'
+    ),
     path('', include('posts.urls')),
 ]
 
@@ -27,6 +34,5 @@ if settings.DEBUG:
     import debug_toolbar
 
     
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
\ No newline at end of file
@@ -1,7 +1,18 @@
+import logging
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.TEMPLATE_WARMUP:
+    from posts.warmup import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        # Без прогрева процесс работает, просто первые запросы медленнее.
+        logging.getLogger(__name__).exception('Прогрев не удался')